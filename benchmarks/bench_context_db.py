@@ -0,0 +1,84 @@
+"""Micro-benchmark: agent steps/second against the context store.
+
+One "step" mirrors what AgentController.start does per loop iteration:
+an add() followed by a get() of the session context.
+
+    python -m benchmarks.bench_context_db --steps 2000 --limit 20
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from context.context_manager import ContextManager
+
+
+class ConnectPerCallStore:
+    """Baseline: the original behaviour, a fresh connection and a commit per call."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.session_id = str(uuid.uuid4())
+        # 复用 ContextManager 的建表逻辑，然后恢复默认的 rollback journal
+        ContextManager(db_path).close()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+    def add(self, data, entry_type="general", tokens_used=0):
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO context (timestamp, data, entry_type, session_id, tokens_used) VALUES (?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(), json.dumps(data), entry_type, self.session_id, tokens_used)
+            )
+            conn.commit()
+            return cursor.lastrowid
+
+    def get(self, limit=None):
+        query = "SELECT timestamp, data FROM context WHERE session_id = ? ORDER BY timestamp DESC"
+        params = [self.session_id]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [{"timestamp": row[0], "data": json.loads(row[1])} for row in rows]
+
+    def close(self):
+        pass
+
+
+def run_steps(store, steps, limit):
+    payload = {"tool": "calculator", "input": "3 + 2", "result": {"result": 5}}
+    start = time.perf_counter()
+    for _ in range(steps):
+        store.add(payload, entry_type="tool_result", tokens_used=10)
+        store.get(limit)
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare context store steps/second before and after connection pooling.")
+    parser.add_argument("--steps", type=int, default=1000, help="Agent steps per run")
+    parser.add_argument("--limit", type=int, default=20, help="Context limit passed to get()")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = ConnectPerCallStore(os.path.join(tmp, "baseline.db"))
+        before = run_steps(baseline, args.steps, args.limit)
+
+        pooled = ContextManager(os.path.join(tmp, "pooled.db"))
+        after = run_steps(pooled, args.steps, args.limit)
+        pooled.close()
+
+    print(f"steps={args.steps} limit={args.limit}")
+    print(f"connect-per-call: {before:10.1f} steps/s")
+    print(f"pooled + WAL:     {after:10.1f} steps/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
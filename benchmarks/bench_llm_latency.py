@@ -0,0 +1,93 @@
+"""Micro-benchmark: tail latency of LLMClient against the local stub server.
+
+Runs the same faulty workload (slow first chunks, 503s, stalled streams)
+with three client settings and reports p50/p95/p99 time-to-decision plus
+failures:
+
+  plain     no timeouts, no retries, no hedging (the original behaviour)
+  retry     first-token/chunk timeouts with jittered-backoff retries
+  hedge     retry + a hedged second request after the p95 first-chunk latency
+
+    python -m benchmarks.bench_llm_latency --requests 200 --slow-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_llm_server import StubBehavior, start_server
+from llm.http_pool import close_clients
+from llm.llm_client import LLMClient
+from parser.response_parser import parse_response
+
+SETTINGS = {
+    "plain": {"max_retries": 0},
+    "retry": {"first_token_timeout": 1.0, "chunk_timeout": 0.5, "max_retries": 3,
+              "backoff_base": 0.05, "backoff_max": 0.5},
+    "hedge": {"first_token_timeout": 1.0, "chunk_timeout": 0.5, "max_retries": 3,
+              "backoff_base": 0.05, "backoff_max": 0.5, "hedge": True},
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run_setting(base_url, options, requests, concurrency, deadline):
+    client = LLMClient(base_url, "stub-key", "stub-model", **options)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(index):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # 不同的提示避免被当成同一请求
+                decision = await asyncio.wait_for(parse_response(client.generate(f"task {index}")), deadline)
+                if decision.get("tool") != "stop":
+                    failures += 1
+                    return
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    await close_clients()
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LLMClient tail latency with and without retries/hedging.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fraction of replies with a slow first chunk")
+    parser.add_argument("--slow-delay", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of requests answered with 503")
+    parser.add_argument("--stall-rate", type=float, default=0.01, help="Fraction of replies that stop mid-stream")
+    parser.add_argument("--deadline", type=float, default=10.0, help="Seconds after which a request counts as failed")
+    parser.add_argument("--settings", default="plain,retry,hedge")
+    args = parser.parse_args()
+
+    print(f"requests={args.requests} concurrency={args.concurrency} slow={args.slow_rate} "
+          f"errors={args.error_rate} stalls={args.stall_rate}")
+    print(f"{'setting':>8}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  {'failed':>6}")
+    for name in args.settings.split(","):
+        behavior = StubBehavior(slow_rate=args.slow_rate, slow_delay=args.slow_delay,
+                                error_rate=args.error_rate, stall_rate=args.stall_rate, seed=1)
+        server, base_url = start_server(behavior)
+        latencies, failures = asyncio.run(
+            run_setting(base_url, SETTINGS[name], args.requests, args.concurrency, args.deadline)
+        )
+        server.shutdown()
+        if latencies:
+            p50, p95, p99 = (percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99))
+            print(f"{name:>8}  {p50:8.1f}  {p95:8.1f}  {p99:8.1f}  {failures:>6}")
+        else:
+            print(f"{name:>8}  {'-':>8}  {'-':>8}  {'-':>8}  {failures:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Micro-benchmark: cost of consuming a streamed completion as it grows.
+
+Feeds synthetic streams of N chunks (prose followed by one action object)
+through the streaming path and reports microseconds per chunk. Linear
+behaviour shows up as a flat per-chunk cost as N doubles.
+
+    python -m benchmarks.bench_llm_stream --chunks 10000 --chunk-size 8
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from llm.llm_stream import LLMStream
+from parser.response_parser import parse_response
+
+
+def make_chunks(count, chunk_size):
+    action = json.dumps({"tool": "stop", "result": "done"})
+    filler = "x" * chunk_size
+    chunks = [filler] * (count - 1) + [action]
+    return chunks
+
+
+async def synthetic_source(chunks):
+    for chunk in chunks:
+        yield chunk
+    yield {"__metadata__": {"tokens_used": len(chunks), "model": "synthetic"}}
+
+
+async def concat_per_chunk(chunks):
+    """Baseline: the original path, `+=` in generate and again in parse_response."""
+    full_content = ""
+    full_response = ""
+    async for chunk in synthetic_source(chunks):
+        if isinstance(chunk, dict):
+            continue
+        full_content += chunk
+        full_response += chunk
+    start = full_response.rfind("{")
+    return json.loads(full_response[start:full_response.rfind("}") + 1])
+
+
+async def stream_and_parse(chunks):
+    stream = LLMStream(synthetic_source(chunks))
+    decision = await parse_response(stream, early_stop=False)
+    assert stream.text and stream.usage is not None
+    return decision
+
+
+def measure(func, chunks, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asyncio.run(func(chunks))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-chunk cost of string concatenation and LLMStream.")
+    parser.add_argument("--chunks", type=int, default=10000, help="Largest stream length; halved three times")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Characters per content chunk")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the best is reported")
+    args = parser.parse_args()
+
+    sizes = [max(args.chunks >> shift, 1) for shift in (3, 2, 1, 0)]
+    print(f"chunk_size={args.chunk_size} repeat={args.repeat}")
+    print(f"{'chunks':>8}  {'concat us/chunk':>16}  {'LLMStream us/chunk':>19}")
+    for size in sizes:
+        chunks = make_chunks(size, args.chunk_size)
+        before = measure(concat_per_chunk, chunks, args.repeat)
+        after = measure(stream_and_parse, chunks, args.repeat)
+        print(f"{size:>8}  {before / size * 1e6:16.2f}  {after / size * 1e6:19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Local OpenAI-compatible stub for exercising LLMClient timeouts, retries and hedging.
+
+Serves POST /v1/chat/completions as a server-sent-event stream. Every reply
+ends with an action object, so parse_response works against it. Faults are
+injected per request with the given probabilities.
+
+    python -m benchmarks.stub_llm_server --port 8765 --slow-rate 0.1 --slow-delay 2
+    OPENAI_API_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubBehavior:
+    def __init__(self, first_token_delay=0.02, chunk_delay=0.0, chunks=20,
+                 slow_rate=0.0, slow_delay=2.0, error_rate=0.0, stall_rate=0.0, seed=None):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        # 以这些概率注入：首包变慢、返回503、中途停止发送
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def draw(self):
+        with self._lock:
+            self.requests += 1
+            return self.random.random(), self.random.random(), self.random.random()
+
+
+def _chunk(completion_id, model, content=None, usage=None):
+    choices = [] if content is None else [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    body = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": model, "choices": choices}
+    if usage is not None:
+        body["usage"] = usage
+    return f"data: {json.dumps(body)}\n\n".encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behavior = StubBehavior()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # 健康检查用的模型列表
+        body = json.dumps({"object": "list", "data": [{"id": "stub-model", "object": "model"}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        behavior = self.behavior
+        error_roll, slow_roll, stall_roll = behavior.draw()
+
+        if error_roll < behavior.error_rate:
+            body = json.dumps({"error": {"message": "stub overloaded", "type": "server_error"}}).encode("utf-8")
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        model = request.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        delay = behavior.slow_delay if slow_roll < behavior.slow_rate else behavior.first_token_delay
+        stall = stall_roll < behavior.stall_rate
+        filler = ["thinking "] * max(behavior.chunks - 1, 0)
+        pieces = filler + [json.dumps({"tool": "stop", "result": "stub"})]
+        try:
+            time.sleep(delay)
+            for index, piece in enumerate(pieces):
+                if stall and index == len(pieces) // 2:
+                    # 模拟卡住的流：连接保持但不再发送
+                    time.sleep(3600)
+                self.wfile.write(_chunk(completion_id, model, content=piece))
+                self.wfile.flush()
+                if behavior.chunk_delay:
+                    time.sleep(behavior.chunk_delay)
+            if (request.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": 50, "completion_tokens": len(pieces), "total_tokens": 50 + len(pieces)}
+                self.wfile.write(_chunk(completion_id, model, usage=usage))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消（提前停止或对冲落败）
+            pass
+
+
+def start_server(behavior, host="127.0.0.1", port=0):
+    """Start the stub in a daemon thread; returns (server, base_url)."""
+    handler = type("BoundStubHandler", (StubHandler,), {"behavior": behavior})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible streaming stub with fault injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.02, help="Seconds before the first chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between chunks")
+    parser.add_argument("--chunks", type=int, default=20, help="Content chunks per reply")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of replies with a slow first chunk")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="First-chunk delay of a slow reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of replies that stop mid-stream")
+    args = parser.parse_args()
+
+    behavior = StubBehavior(args.first_token_delay, args.chunk_delay, args.chunks,
+                            args.slow_rate, args.slow_delay, args.error_rate, args.stall_rate)
+    server, base_url = start_server(behavior, args.host, args.port)
+    print(f"stub LLM server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,188 @@
+import json
+import os
+
+
 class ConfigLoader:
     def __init__(self, model="gpt-3.5-turbo", 
                  api_key="your-api-key", 
                  api_base_url="https://api.example.com", 
                  collaboration=False,
-                 context_db_path="context.db"):
+                 context_db_path="context.db",
+                 context_write_behind=False,
+                 context_flush_size=64,
+                 context_flush_interval=0.5,
+                 context_cache_sessions=128,
+                 context_cache_entries=1000,
+                 context_token_budget=None,
+                 context_summary_ratio=0.25,
+                 context_low_water=0.5,
+                 parse_early_stop=True,
+                 parse_usage_grace=0.5,
+                 llm_stream_usage=True,
+                 llm_cache=False,
+                 llm_cache_size=256,
+                 llm_cache_ttl=3600,
+                 llm_cache_persist=False,
+                 llm_max_connections=100,
+                 llm_max_keepalive=20,
+                 llm_keepalive_expiry=30.0,
+                 llm_timeout=60.0,
+                 llm_connect_timeout=10.0,
+                 llm_http2=False,
+                 llm_first_token_timeout=None,
+                 llm_chunk_timeout=None,
+                 llm_max_retries=2,
+                 llm_backoff_base=0.5,
+                 llm_backoff_max=8.0,
+                 llm_hedge=False,
+                 llm_hedge_delay=None,
+                 llm_endpoints=None,
+                 llm_router_strategy="least_outstanding",
+                 llm_circuit_failures=3,
+                 llm_circuit_cooldown=30.0,
+                 llm_health_interval=None,
+                 llm_rpm=None,
+                 llm_tpm=None,
+                 llm_rate_burst=10.0,
+                 llm_completion_reserve=256,
+                 tool_executor="thread",
+                 tool_workers=None,
+                 tool_timeout=None,
+                 tool_max_concurrency=None,
+                 tools=None,
+                 tool_entry_points=True,
+                 tool_cache=True,
+                 tool_cache_size=1024,
+                 trace_export=None,
+                 trace_path="data/traces.jsonl",
+                 trace_endpoint="http://localhost:4318/v1/traces",
+                 metrics_port=None,
+                 metrics_host="127.0.0.1",
+                 metrics_dump=None,
+                 log_queue=False):
         self.config = {
             "model": model,
             "api_key": api_key,
             "api_base_url": api_base_url,
             "collaboration": collaboration,
-            "context_db_path": context_db_path
+            "context_db_path": context_db_path,
+            "context_write_behind": context_write_behind,
+            "context_flush_size": context_flush_size,
+            "context_flush_interval": context_flush_interval,
+            "context_cache_sessions": context_cache_sessions,
+            "context_cache_entries": context_cache_entries,
+            "context_token_budget": context_token_budget,
+            "context_summary_ratio": context_summary_ratio,
+            "context_low_water": context_low_water,
+            "parse_early_stop": parse_early_stop,
+            "parse_usage_grace": parse_usage_grace,
+            "llm_stream_usage": llm_stream_usage,
+            "llm_cache": llm_cache,
+            "llm_cache_size": llm_cache_size,
+            "llm_cache_ttl": llm_cache_ttl,
+            "llm_cache_persist": llm_cache_persist,
+            "llm_max_connections": llm_max_connections,
+            "llm_max_keepalive": llm_max_keepalive,
+            "llm_keepalive_expiry": llm_keepalive_expiry,
+            "llm_timeout": llm_timeout,
+            "llm_connect_timeout": llm_connect_timeout,
+            "llm_http2": llm_http2,
+            "llm_first_token_timeout": llm_first_token_timeout,
+            "llm_chunk_timeout": llm_chunk_timeout,
+            "llm_max_retries": llm_max_retries,
+            "llm_backoff_base": llm_backoff_base,
+            "llm_backoff_max": llm_backoff_max,
+            "llm_hedge": llm_hedge,
+            "llm_hedge_delay": llm_hedge_delay,
+            "llm_endpoints": llm_endpoints or [],
+            "llm_router_strategy": llm_router_strategy,
+            "llm_circuit_failures": llm_circuit_failures,
+            "llm_circuit_cooldown": llm_circuit_cooldown,
+            "llm_health_interval": llm_health_interval,
+            "llm_rpm": llm_rpm,
+            "llm_tpm": llm_tpm,
+            "llm_rate_burst": llm_rate_burst,
+            "llm_completion_reserve": llm_completion_reserve,
+            "tool_executor": tool_executor,
+            "tool_workers": tool_workers,
+            "tool_timeout": tool_timeout,
+            "tool_max_concurrency": tool_max_concurrency,
+            "tools": tools or [],
+            "tool_entry_points": tool_entry_points,
+            "tool_cache": tool_cache,
+            "tool_cache_size": tool_cache_size,
+            "trace_export": trace_export,
+            "trace_path": trace_path,
+            "trace_endpoint": trace_endpoint,
+            "metrics_port": metrics_port,
+            "metrics_host": metrics_host,
+            "metrics_dump": metrics_dump,
+            "log_queue": log_queue
         }
 
+    @classmethod
+    def from_env(cls):
+        """Build a ConfigLoader from environment variables (see local/.env.example)."""
+        return cls(
+            model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+            api_key=os.getenv("OPENAI_API_KEY", "your-openai-api-key"),  # Fallback for testing
+            api_base_url=os.getenv("OPENAI_API_BASE_URL", None),  # None uses OpenAI default
+            collaboration=os.getenv("COLLABORATION", "False").lower() == "true",
+            context_db_path=os.getenv("CONTEXT_DB_PATH", "context.db"),
+            context_write_behind=os.getenv("CONTEXT_WRITE_BEHIND", "False").lower() == "true",
+            context_flush_size=int(os.getenv("CONTEXT_FLUSH_SIZE", "64")),
+            context_flush_interval=float(os.getenv("CONTEXT_FLUSH_INTERVAL", "0.5")),
+            context_cache_sessions=int(os.getenv("CONTEXT_CACHE_SESSIONS", "128")),
+            context_cache_entries=int(os.getenv("CONTEXT_CACHE_ENTRIES", "1000")),
+            context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")) or None,
+            context_summary_ratio=float(os.getenv("CONTEXT_SUMMARY_RATIO", "0.25")),
+            context_low_water=float(os.getenv("CONTEXT_LOW_WATER", "0.5")),
+            parse_early_stop=os.getenv("PARSE_EARLY_STOP", "True").lower() == "true",
+            parse_usage_grace=float(os.getenv("PARSE_USAGE_GRACE", "0.5")),
+            llm_stream_usage=os.getenv("LLM_STREAM_USAGE", "True").lower() == "true",
+            llm_cache=os.getenv("LLM_CACHE", "False").lower() == "true",
+            llm_cache_size=int(os.getenv("LLM_CACHE_SIZE", "256")),
+            llm_cache_ttl=float(os.getenv("LLM_CACHE_TTL", "3600")) or None,
+            llm_cache_persist=os.getenv("LLM_CACHE_PERSIST", "False").lower() == "true",
+            llm_max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            llm_max_keepalive=int(os.getenv("LLM_MAX_KEEPALIVE", "20")),
+            llm_keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+            llm_timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            llm_connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+            llm_http2=os.getenv("LLM_HTTP2", "False").lower() == "true",
+            llm_first_token_timeout=float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "0")) or None,
+            llm_chunk_timeout=float(os.getenv("LLM_CHUNK_TIMEOUT", "0")) or None,
+            llm_max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            llm_backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+            llm_backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "8")),
+            llm_hedge=os.getenv("LLM_HEDGE", "False").lower() == "true",
+            llm_hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "0")) or None,
+            llm_endpoints=json.loads(os.getenv("LLM_ENDPOINTS", "[]") or "[]"),
+            llm_router_strategy=os.getenv("LLM_ROUTER_STRATEGY", "least_outstanding"),
+            llm_circuit_failures=int(os.getenv("LLM_CIRCUIT_FAILURES", "3")),
+            llm_circuit_cooldown=float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30")),
+            llm_health_interval=float(os.getenv("LLM_HEALTH_INTERVAL", "0")) or None,
+            llm_rpm=int(os.getenv("LLM_RPM", "0")) or None,
+            llm_tpm=int(os.getenv("LLM_TPM", "0")) or None,
+            llm_rate_burst=float(os.getenv("LLM_RATE_BURST", "10")),
+            llm_completion_reserve=int(os.getenv("LLM_COMPLETION_RESERVE", "256")),
+            tool_executor=os.getenv("TOOL_EXECUTOR", "thread"),
+            tool_workers=int(os.getenv("TOOL_WORKERS", "0")) or None,
+            tool_timeout=float(os.getenv("TOOL_TIMEOUT", "0")) or None,
+            tool_max_concurrency=int(os.getenv("TOOL_MAX_CONCURRENCY", "0")) or None,
+            tools=json.loads(os.getenv("TOOLS", "[]") or "[]"),
+            tool_entry_points=os.getenv("TOOL_ENTRY_POINTS", "True").lower() == "true",
+            tool_cache=os.getenv("TOOL_CACHE", "True").lower() == "true",
+            tool_cache_size=int(os.getenv("TOOL_CACHE_SIZE", "1024")),
+            trace_export=os.getenv("TRACE_EXPORT", "") or None,
+            trace_path=os.getenv("TRACE_PATH", "data/traces.jsonl"),
+            trace_endpoint=os.getenv("TRACE_ENDPOINT", "http://localhost:4318/v1/traces"),
+            metrics_port=int(os.getenv("METRICS_PORT", "0")) or None,
+            metrics_host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            metrics_dump=os.getenv("METRICS_DUMP", "") or None,
+            log_queue=os.getenv("LOG_QUEUE", "False").lower() == "true"
+        )
+
     def update(self, **kwargs):
         self.config.update(kwargs)
 
@@ -1,24 +1,206 @@
-import sqlite3
+import asyncio
+import atexit
+import functools
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import uuid
 from utils.logger import logger
+from utils.metrics import DB_WRITE_SECONDS, ERRORS
+from context.sqlite_pool import SQLitePool
+from context.session_cache import SessionCache
 
 # In context/context_manager.py
 VALID_ENTRY_TYPES = {"tool_result", "error", "human_input", "general", "custom_type","stop"}
 
+INSERT_ENTRY_SQL = (
+    "INSERT INTO context (timestamp, data, entry_type, session_id, tokens_used, prompt_tokens, completion_tokens) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+# 旧数据库缺少的列，初始化时补齐
+TOKEN_COLUMNS = ("prompt_tokens", "completion_tokens")
+LOAD_SESSION_SQL = "SELECT id, timestamp, data, entry_type FROM context WHERE session_id = ? ORDER BY id DESC LIMIT ?"
+
 
 class ContextManager:
-    def __init__(self, db_path="context.db"):
+    def __init__(self, db_path="context.db", pragmas=None,
+                 write_behind=False, flush_size=64, flush_interval=0.5,
+                 cache_sessions=128, cache_entries=1000):
         self.db_path = db_path
         self.session_id = str(uuid.uuid4())
+        self._pool = SQLitePool(db_path, pragmas=pragmas)
+        self._closing = False
+        self._closed = False
         logger.debug(f"初始化上下文管理器: 数据库路径={db_path}, 初始会话ID={self.session_id}")
         self._init_db()
 
+        # 会话级内存缓存：get() 只在未命中时（如恢复旧会话）访问数据库
+        self._cache = SessionCache(cache_sessions, cache_entries) if cache_sessions else None
+        if self._cache is not None:
+            self._cache.start(self.session_id)
+
+        # 写后模式：add() 只入队，由后台线程按条数/时间阈值批量提交
+        self.write_behind = write_behind
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._pending_entries = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher = None
+        # 异步接口使用的专用数据库线程（懒创建）
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="context-flusher", daemon=True)
+            self._flusher.start()
+            # 保证进程正常退出时队列中的条目落盘
+            atexit.register(self.close)
+            logger.debug(f"启用写后模式: 批量大小={flush_size}, 刷新间隔={flush_interval}秒")
+
+    def close(self):
+        """Flush pending writes and close the pooled database connections.
+
+        Work already queued on the DB thread runs first, then the flusher
+        stops and one final flush writes whatever is left. Adds after that
+        raise RuntimeError. If the final flush fails, the number of lost
+        entries is logged as a warning and the error is re-raised after the pool is closed.
+        """
+        with self._pending_lock:
+            if self._closing:
+                return
+            self._closing = True
+        # 先排空DB线程上排队的 aadd/aadd_many，它们的条目才能赶上最后一次刷新
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        with self._pending_lock:
+            # 在队列锁内置位：此后的 add() 不会再把条目放进无人刷新的队列
+            self._closed = True
+        if self._flusher is not None:
+            self._flush_event.set()
+            self._flusher.join()
+            atexit.unregister(self.close)
+        try:
+            self.flush()
+        except Exception:
+            logger.warning(f"关闭时写入上下文失败: {len(self._pending)} 条条目未落盘")
+            raise
+        finally:
+            self._pool.close()
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError(f"上下文管理器已关闭: {self.db_path}")
+
+    async def aclose(self):
+        """Async variant of close(): drains queued DB-thread work (aadd etc.) before the final flush."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-db")
+        return self._executor
+
+    async def _run_in_db_thread(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    async def aadd(self, data, entry_type="general", tokens_used=0, session_id=None,
+                   prompt_tokens=0, completion_tokens=0):
+        """Async add(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(
+            self.add, data, entry_type=entry_type, tokens_used=tokens_used, session_id=session_id,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+
+    async def aadd_many(self, items, session_id=None):
+        """Async add_many(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(self.add_many, items, session_id=session_id)
+
+    async def aget(self, limit=None, entry_type=None, all_sessions=False, session_id=None,
+                   after_id=None, before_id=None):
+        """Async get(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(
+            self.get, limit=limit, entry_type=entry_type, all_sessions=all_sessions, session_id=session_id,
+            after_id=after_id, before_id=before_id
+        )
+
+    async def aquery(self, start_time=None, end_time=None, entry_type=None, session_id=None,
+                     after_id=None, limit=None):
+        """Async query(); runs on the dedicated DB thread and returns a list."""
+        def query_list():
+            return list(self.query(start_time, end_time, entry_type, session_id, after_id, limit))
+        return await self._run_in_db_thread(query_list)
+
+    async def aget_sessions(self):
+        """Async get_sessions(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(self.get_sessions)
+
+    async def aget_token_usage(self, session_id=None, start_time=None, end_time=None):
+        """Async get_token_usage(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(
+            self.get_token_usage, session_id=session_id, start_time=start_time, end_time=end_time
+        )
+
+    async def aclear(self, current_session_only=True, session_id=None):
+        """Async clear(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(self.clear, current_session_only=current_session_only, session_id=session_id)
+
+    async def anew_session(self):
+        """Async new_session(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(self.new_session)
+
+    async def aflush(self):
+        """Async flush(); runs on the dedicated DB thread."""
+        return await self._run_in_db_thread(self.flush)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception:
+                # 失败的批次已放回队列，下一轮重试；错误已在 flush 中记录
+                pass
+
+    def flush(self):
+        """Write all queued entries in a single transaction. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+                entries, self._pending_entries = self._pending_entries, []
+            if not batch:
+                return 0
+            try:
+                start = time.perf_counter()
+                with self._pool.connection() as conn:
+                    conn.executemany(INSERT_ENTRY_SQL, batch)
+                    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                DB_WRITE_SECONDS.observe(time.perf_counter() - start, op="flush")
+                # 同一事务内持有写锁，批次的自增ID是连续的，据此回填缓存条目的ID
+                first_id = last_id - len(batch) + 1
+                for offset, entry in enumerate(entries):
+                    entry["id"] = first_id + offset
+                logger.debug("批量写入上下文条目: 条数=%d", len(batch))
+                return len(batch)
+            except Exception as e:
+                with self._pending_lock:
+                    self._pending[:0] = batch
+                    self._pending_entries[:0] = entries
+                ERRORS.inc(component="context")
+                logger.error(f"批量写入上下文条目失败: {str(e)}")
+                raise
+
     def _init_db(self):
         """Initialize the SQLite database and create the context table if it doesn't exist."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS context (
@@ -27,141 +209,329 @@ class ContextManager:
                         data TEXT NOT NULL,
                         entry_type TEXT NOT NULL,
                         session_id TEXT NOT NULL,
-                        tokens_used INTEGER DEFAULT 0
+                        tokens_used INTEGER DEFAULT 0,
+                        prompt_tokens INTEGER DEFAULT 0,
+                        completion_tokens INTEGER DEFAULT 0
                     )
                 """)
+                columns = {row[1] for row in cursor.execute("PRAGMA table_info(context)")}
+                for column in TOKEN_COLUMNS:
+                    if column not in columns:
+                        cursor.execute(f"ALTER TABLE context ADD COLUMN {column} INTEGER DEFAULT 0")
+                        logger.debug(f"数据库迁移: 新增列 {column}")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON context (timestamp)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_entry_type ON context (entry_type)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_id ON context (session_id)")
-                conn.commit()
+                # (session_id, id) 复合索引让单会话查询按主键顺序读取并分页，无需额外排序；
+                # 它同时覆盖了原来的单列 session_id 索引
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_id_id ON context (session_id, id)")
+                cursor.execute("DROP INDEX IF EXISTS idx_session_id")
                 logger.debug(f"数据库初始化成功: {self.db_path}")
         except Exception as e:
             logger.error(f"数据库初始化失败: {str(e)}")
             raise
 
-    def add(self, data, entry_type="general", tokens_used=0):
-        """Add a context entry to the database."""
+    def _make_row(self, data, entry_type, session_id, tokens_used=0, prompt_tokens=0, completion_tokens=0):
+        """Validate an entry and return its insert row and the decoded copy kept in the cache."""
         if entry_type not in VALID_ENTRY_TYPES:
             error_msg = f"无效的条目类型: {entry_type}. 必须是 {VALID_ENTRY_TYPES} 之一"
             logger.error(error_msg)
             raise ValueError(error_msg)
-            
+
         timestamp = datetime.now().isoformat()
         data_json = json.dumps(data)  # Serialize data to JSON
+        row = (timestamp, data_json, entry_type, session_id, tokens_used, prompt_tokens, completion_tokens)
+        # 缓存中保存解码后的副本，与从数据库读取的结果保持一致
+        entry = {"id": None, "timestamp": timestamp, "data": json.loads(data_json)}
+        return row, entry
+
+    def add(self, data, entry_type="general", tokens_used=0, session_id=None,
+            prompt_tokens=0, completion_tokens=0):
+        """Add a context entry to the database.
+
+        session_id defaults to the manager's current session; pass it explicitly
+        when several agents share one manager. tokens_used is the total for the
+        LLM call; prompt_tokens and completion_tokens are its breakdown.
+        """
+        session_id = session_id or self.session_id
+        row, entry = self._make_row(data, entry_type, session_id, tokens_used, prompt_tokens, completion_tokens)
+        if self.write_behind:
+            with self._pending_lock:
+                self._check_open()
+                self._pending.append(row)
+                self._pending_entries.append(entry)
+                pending = len(self._pending)
+            if self._cache is not None:
+                self._cache.append(session_id, entry_type, entry)
+            if pending >= self.flush_size:
+                self._flush_event.set()
+            logger.debug("上下文条目入队: 类型=%s, 会话=%s, 待写入=%d", entry_type, session_id, pending)
+            return None
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            start = time.perf_counter()
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO context (timestamp, data, entry_type, session_id, tokens_used) VALUES (?, ?, ?, ?, ?)",
-                    (timestamp, data_json, entry_type, self.session_id, tokens_used)
-                )
+                cursor.execute(INSERT_ENTRY_SQL, row)
                 entry_id = cursor.lastrowid
-                conn.commit()
-                logger.debug(f"添加上下文条目: ID={entry_id}, 类型={entry_type}, 会话={self.session_id}, token消耗={tokens_used}")
-                return entry_id
+            DB_WRITE_SECONDS.observe(time.perf_counter() - start, op="add")
+            entry["id"] = entry_id
+            if self._cache is not None:
+                self._cache.append(session_id, entry_type, entry)
+            logger.debug("添加上下文条目: ID=%s, 类型=%s, 会话=%s, token消耗=%s", entry_id, entry_type, session_id, tokens_used)
+            return entry_id
         except Exception as e:
+            ERRORS.inc(component="context")
             logger.error(f"添加上下文条目失败: {str(e)}")
             raise
 
-    def get(self, limit=None, entry_type=None, all_sessions=False):
-        """Retrieve context entries from the database."""
-        query = "SELECT timestamp, data FROM context"
+    def add_many(self, items, session_id=None):
+        """Add several entries of one session in a single transaction.
+
+        Each item is a dict with "data" and optionally "entry_type",
+        "tokens_used", "prompt_tokens" and "completion_tokens" (the add()
+        keyword arguments). Returns the new ids in order, or None in
+        write-behind mode.
+        """
+        session_id = session_id or self.session_id
+        rows = []
+        entries = []
+        for item in items:
+            row, entry = self._make_row(
+                item["data"], item.get("entry_type", "general"), session_id,
+                item.get("tokens_used", 0), item.get("prompt_tokens", 0), item.get("completion_tokens", 0)
+            )
+            rows.append(row)
+            entries.append(entry)
+        if not rows:
+            return []
+        if self.write_behind:
+            with self._pending_lock:
+                self._check_open()
+                self._pending.extend(rows)
+                self._pending_entries.extend(entries)
+                pending = len(self._pending)
+            if self._cache is not None:
+                for row, entry in zip(rows, entries):
+                    self._cache.append(session_id, row[2], entry)
+            if pending >= self.flush_size:
+                self._flush_event.set()
+            logger.debug("上下文条目批量入队: 条数=%d, 会话=%s, 待写入=%d", len(rows), session_id, pending)
+            return None
+        try:
+            start = time.perf_counter()
+            with self._pool.connection() as conn:
+                conn.executemany(INSERT_ENTRY_SQL, rows)
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            DB_WRITE_SECONDS.observe(time.perf_counter() - start, op="add_many")
+            # 同一事务内ID连续，与 flush() 相同的回填方式
+            first_id = last_id - len(rows) + 1
+            for offset, entry in enumerate(entries):
+                entry["id"] = first_id + offset
+            if self._cache is not None:
+                for row, entry in zip(rows, entries):
+                    self._cache.append(session_id, row[2], entry)
+            logger.debug("批量添加上下文条目: 条数=%d, 会话=%s", len(rows), session_id)
+            return [entry["id"] for entry in entries]
+        except Exception as e:
+            ERRORS.inc(component="context")
+            logger.error(f"批量添加上下文条目失败: {str(e)}")
+            raise
+
+    def get(self, limit=None, entry_type=None, all_sessions=False, session_id=None,
+            after_id=None, before_id=None):
+        """Retrieve context entries in chronological (id) order.
+
+        Without a cursor, returns the newest `limit` entries. after_id returns
+        the first `limit` entries with a larger id and before_id the last
+        `limit` entries with a smaller id, so a caller can page through a
+        session by passing the id of the last (or first) entry it received.
+        Single-session reads without a cursor are served from the in-memory cache.
+        """
+        if self._cache is not None and not all_sessions and after_id is None and before_id is None:
+            session_id = session_id or self.session_id
+            entries = self._cache.lookup(session_id, limit, entry_type)
+            if entries is None:
+                self._load_session(session_id)
+                entries = self._cache.lookup(session_id, limit, entry_type)
+            if entries is not None:
+                logger.debug("检索上下文条目(缓存): 条数=%d, 限制=%s, 类型=%s, 会话=%s", len(entries), limit, entry_type, session_id)
+                return entries
+        return self._get_from_db(limit, entry_type, all_sessions, session_id, after_id, before_id)
+
+    def _load_session(self, session_id):
+        """Load the newest cache_entries rows of a session into the cache."""
+        self.flush()
+        max_entries = self._cache.max_entries
+        try:
+            with self._pool.connection() as conn:
+                rows = conn.execute(LOAD_SESSION_SQL, (session_id, max_entries + 1)).fetchall()
+        except Exception as e:
+            logger.error(f"加载会话上下文失败: {str(e)}")
+            raise
+        complete = len(rows) <= max_entries
+        rows = rows[:max_entries]
+        rows.reverse()
+        self._cache.load(
+            session_id,
+            [(row[3], {"id": row[0], "timestamp": row[1], "data": json.loads(row[2])}) for row in rows],
+            complete
+        )
+        logger.debug(f"加载会话上下文到缓存: 会话={session_id}, 条数={len(rows)}, 完整={complete}")
+
+    def _get_from_db(self, limit=None, entry_type=None, all_sessions=False, session_id=None,
+                     after_id=None, before_id=None):
+        self.flush()
+        query = "SELECT id, timestamp, data FROM context"
         params = []
         conditions = []
 
         if not all_sessions:
             conditions.append("session_id = ?")
-            params.append(self.session_id)
+            params.append(session_id or self.session_id)
 
         if entry_type:
             conditions.append("entry_type = ?")
             params.append(entry_type)
 
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
 
-        query += " ORDER BY timestamp DESC"
-        if limit!=None:
+        # 带 limit 且没有 after_id 时取最新的 limit 条，倒序读取后再翻转为时间顺序
+        newest_first = limit is not None and after_id is None
+        query += " ORDER BY id DESC" if newest_first else " ORDER BY id ASC"
+        if limit is not None:
             query += " LIMIT ?"
             params.append(limit)
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
                 results = cursor.fetchall()
-                logger.debug(f"检索上下文条目: 条数={len(results)}, 限制={limit}, 类型={entry_type}, 所有会话={all_sessions}")
-                # Return in the format expected by prompt_generator: [{"timestamp": ..., "data": ...}]
+                if newest_first:
+                    results.reverse()
+                logger.debug("检索上下文条目: 条数=%d, 限制=%s, 类型=%s, 所有会话=%s", len(results), limit, entry_type, all_sessions)
+                # Return in the format expected by prompt_generator: [{"id": ..., "timestamp": ..., "data": ...}]
                 return [
-                    {"timestamp": row[0], "data": json.loads(row[1])}
+                    {"id": row[0], "timestamp": row[1], "data": json.loads(row[2])}
                     for row in results
                 ]
         except Exception as e:
             logger.error(f"检索上下文条目失败: {str(e)}")
             raise
 
-    def clear(self, current_session_only=True):
+    def clear(self, current_session_only=True, session_id=None):
         """Clear context entries from the database."""
+        self.flush()
+        if self._cache is not None:
+            self._cache.invalidate((session_id or self.session_id) if current_session_only else None)
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
                 if current_session_only:
-                    cursor.execute("DELETE FROM context WHERE session_id = ?", (self.session_id,))
-                    logger.debug(f"清除当前会话({self.session_id})的上下文条目")
+                    session_id = session_id or self.session_id
+                    cursor.execute("DELETE FROM context WHERE session_id = ?", (session_id,))
+                    logger.debug(f"清除当前会话({session_id})的上下文条目")
                 else:
                     cursor.execute("DELETE FROM context")
                     logger.debug("清除所有会话的上下文条目")
                 deleted_rows = cursor.rowcount
-                conn.commit()
                 return deleted_rows
         except Exception as e:
             logger.error(f"清除上下文条目失败: {str(e)}")
             raise
 
+    def create_session(self):
+        """Return a fresh session_id without changing the manager's current session."""
+        session_id = str(uuid.uuid4())
+        if self._cache is not None:
+            self._cache.start(session_id)
+        logger.debug(f"分配会话ID: {session_id}")
+        return session_id
+
     def new_session(self):
         """Start a new session with a new session_id."""
+        self.flush()
         old_session = self.session_id
         self.session_id = str(uuid.uuid4())
+        if self._cache is not None:
+            self._cache.start(self.session_id)
         logger.debug(f"创建新会话: 旧会话={old_session}, 新会话={self.session_id}")
         return self.session_id
 
-    def replay(self, limit=None, entry_type=None, session_id=None):
-        """Replay context history by printing entries."""
-        query = "SELECT timestamp, data, session_id, entry_type FROM context"
-        params = []
-        conditions = []
+    def iter_entries(self, start_time=None, end_time=None, entry_type=None, session_id=None,
+                     after_id=None, limit=None, chunk_size=500, follow=False, poll_interval=1.0):
+        """Yield raw rows (id, timestamp, data, session_id, entry_type) in id order.
 
+        Rows are read in keyset pages of chunk_size, each page a short query of
+        its own, so memory stays flat however large the table is. With
+        follow=True the generator keeps polling for new rows instead of
+        stopping at the end of the table.
+        """
+        conditions = []
+        params = []
         if session_id:
             conditions.append("session_id = ?")
             params.append(session_id)
-
         if entry_type:
             conditions.append("entry_type = ?")
             params.append(entry_type)
+        if start_time:
+            conditions.append("timestamp >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append("timestamp <= ?")
+            params.append(end_time)
+        conditions.append("id > ?")
+        query = ("SELECT id, timestamp, data, session_id, entry_type FROM context WHERE "
+                 + " AND ".join(conditions) + " ORDER BY id ASC LIMIT ?")
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+        last_id = after_id if after_id is not None else 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = chunk_size if remaining is None else min(chunk_size, remaining)
+            self.flush()
+            try:
+                with self._pool.connection() as conn:
+                    rows = conn.execute(query, params + [last_id, page_size]).fetchall()
+            except Exception as e:
+                logger.error(f"读取上下文条目失败: {str(e)}")
+                raise
+            for row in rows:
+                yield row
+            if rows:
+                last_id = rows[-1][0]
+                if remaining is not None:
+                    remaining -= len(rows)
+            if len(rows) < page_size:
+                if not follow:
+                    return
+                time.sleep(poll_interval)
 
-        query += " ORDER BY timestamp ASC"
-        if limit:
-            query += " LIMIT ?"
-            params.append(limit)
+    def replay(self, limit=None, entry_type=None, session_id=None, after_id=None,
+               chunk_size=500, follow=False, poll_interval=1.0):
+        """Replay context history by printing entries as they are read; returns the number printed.
 
+        after_id resumes after a previously seen id; follow keeps printing new
+        entries until interrupted.
+        """
+        logger.debug(f"回放上下文历史: 限制={limit}, 类型={entry_type}, 会话={session_id}, 跟随={follow}")
+        count = 0
+        current_session = None
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                
-            if not rows:
-                logger.info("未找到上下文条目")
-                return
-
-            logger.debug(f"回放上下文历史: 条数={len(rows)}, 限制={limit}, 类型={entry_type}, 会话={session_id}")
-            logger.status(f"\n===== 开始回放上下文历史 =====")
-            
-            current_session = None
-            for timestamp, data_json, session, entry_type in rows:
+            for _, timestamp, data_json, session, entry_type in self.iter_entries(
+                entry_type=entry_type, session_id=session_id, after_id=after_id, limit=limit,
+                chunk_size=chunk_size, follow=follow, poll_interval=poll_interval
+            ):
+                if count == 0:
+                    logger.status(f"\n===== 开始回放上下文历史 =====")
+                count += 1
                 data = json.loads(data_json)
                 if current_session != session:
                     current_session = session
@@ -186,22 +556,26 @@ class ContextManager:
                     logger.result(f"{result}")
                 else:
                     logger.info(f"[{timestamp}] {entry_type}: {data}")
-            
-            logger.status(f"\n===== 上下文历史回放结束 =====")    
-            return rows
         except Exception as e:
             logger.error(f"回放上下文历史失败: {str(e)}")
             raise
 
+        if count == 0:
+            logger.info("未找到上下文条目")
+        else:
+            logger.status(f"\n===== 上下文历史回放结束 =====")
+        return count
+
     def get_sessions(self):
         """Get a list of all session IDs."""
+        self.flush()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT session_id FROM context 
                     GROUP BY session_id 
-                    ORDER BY MIN(timestamp)
+                    ORDER BY MIN(id)
                 """)
                 sessions = [row[0] for row in cursor.fetchall()]
                 logger.debug(f"获取会话列表: 数量={len(sessions)}")
@@ -210,45 +584,18 @@ class ContextManager:
             logger.error(f"获取会话列表失败: {str(e)}")
             raise
 
-    def query(self, start_time=None, end_time=None, entry_type=None, session_id=None):
-        """Query context entries with optional time range, entry type, and session filters."""
-        query = "SELECT timestamp, data, session_id FROM context"
-        params = []
-        conditions = []
+    def query(self, start_time=None, end_time=None, entry_type=None, session_id=None,
+              after_id=None, limit=None, chunk_size=500, follow=False, poll_interval=1.0):
+        """Query context entries with optional time range, entry type, and session filters.
 
-        if session_id:
-            conditions.append("session_id = ?")
-            params.append(session_id)
-        
-        if entry_type:
-            conditions.append("entry_type = ?")
-            params.append(entry_type)
-        if start_time:
-            conditions.append("timestamp >= ?")
-            params.append(start_time)
-        if end_time:
-            conditions.append("timestamp <= ?")
-            params.append(end_time)
-
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-
-        query += " ORDER BY timestamp ASC"
+        Returns a generator over entries in id order, read chunk_size rows at
+        a time; see iter_entries for after_id/limit/follow.
+        """
+        logger.debug(f"查询上下文条目: 开始时间={start_time}, 结束时间={end_time}, 类型={entry_type}, 会话={session_id}")
+        for row in self.iter_entries(start_time, end_time, entry_type, session_id, after_id, limit,
+                                     chunk_size, follow, poll_interval):
+            yield {"id": row[0], "timestamp": row[1], "data": json.loads(row[2]), "session_id": row[3]}
 
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                logger.debug(f"查询上下文条目: 条数={len(results)}, 开始时间={start_time}, 结束时间={end_time}, 类型={entry_type}, 会话={session_id}")
-                return [
-                    {"timestamp": row[0], "data": json.loads(row[1]), "session_id": row[2]}
-                    for row in results
-                ]
-        except Exception as e:
-            logger.error(f"查询上下文条目失败: {str(e)}")
-            raise
-            
     def get_token_usage(self, session_id=None, start_time=None, end_time=None):
         """获取token使用统计
         
@@ -258,9 +605,12 @@ class ContextManager:
             end_time (str, optional): 结束时间(ISO格式)
             
         Returns:
-            dict: token使用统计信息，包括总量和各会话的分布
+            dict: token使用统计信息，包括总量、prompt/completion 分项和各会话的分布。
+                sessions 为各会话的总量，session_usage 为各会话的分项
         """
-        query = "SELECT session_id, SUM(tokens_used) as total FROM context"
+        self.flush()
+        columns = "SUM(tokens_used), SUM(prompt_tokens), SUM(completion_tokens)"
+        query = f"SELECT session_id, {columns} FROM context"
         params = []
         conditions = []
         
@@ -280,31 +630,35 @@ class ContextManager:
         query += " GROUP BY session_id"
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
                 
-                # 获取总token消耗
-                total_query = "SELECT SUM(tokens_used) FROM context"
-                total_params = []
-                
-                if conditions:
-                    total_query += " WHERE " + " AND ".join(conditions)
-                    total_params.extend(params)
-                
-                cursor.execute(total_query, total_params)
-                total_tokens = cursor.fetchone()[0] or 0
-                
-                # 获取会话分布
+                # 按会话分组汇总，总量由分组结果累加得到
                 cursor.execute(query, params)
                 sessions = {}
-                for session_id, tokens in cursor.fetchall():
-                    sessions[session_id] = tokens
+                session_usage = {}
+                total_tokens = prompt_tokens = completion_tokens = 0
+                for sid, total, prompt, completion in cursor.fetchall():
+                    total, prompt, completion = total or 0, prompt or 0, completion or 0
+                    sessions[sid] = total
+                    session_usage[sid] = {
+                        "total_tokens": total,
+                        "prompt_tokens": prompt,
+                        "completion_tokens": completion
+                    }
+                    total_tokens += total
+                    prompt_tokens += prompt
+                    completion_tokens += completion
                 
-                logger.debug(f"Token使用统计: 总量={total_tokens}, 会话数={len(sessions)}")
+                logger.debug(f"Token使用统计: 总量={total_tokens}, prompt={prompt_tokens}, "
+                             f"completion={completion_tokens}, 会话数={len(sessions)}")
                 
                 return {
                     "total_tokens": total_tokens,
-                    "sessions": sessions
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "sessions": sessions,
+                    "session_usage": session_usage
                 }
         except Exception as e:
             logger.error(f"获取token使用统计失败: {str(e)}")
@@ -0,0 +1,155 @@
+from prompt.prompt_generator import render_entry
+from utils.logger import logger
+from utils.token_counter import estimate_tokens
+
+SUMMARY_LINE_CHARS = 200
+
+
+def summarize_line(data):
+    """One compact line for a context entry's data."""
+    if not isinstance(data, dict):
+        line = str(data)
+    elif "tool" in data:
+        outcome = data.get("result", data.get("error", ""))
+        line = f"{data['tool']}({data.get('input', '')}) -> {outcome}"
+    elif "human_input" in data:
+        line = f"user: {data['human_input']}"
+    elif "error" in data:
+        line = f"error: {data['error']}"
+    elif "summary" in data:
+        line = str(data["summary"])
+    else:
+        line = str(data)
+    if len(line) > SUMMARY_LINE_CHARS:
+        line = line[:SUMMARY_LINE_CHARS - 3] + "..."
+    return line
+
+
+class ContextWindow:
+    """Select context entries for a prompt under a token budget.
+
+    Entries are packed newest-first. When they do not all fit, the older ones
+    are collapsed into a single summary entry that takes at most
+    summary_ratio of the budget. A collapse keeps only low_water of the
+    remaining budget of recent entries, and the same summary is reused on
+    later steps until those entries overflow the budget again, so the window
+    grows append-only between collapses. Per-entry token counts, summary lines
+    and the rendered summary are cached, so one instance should live for a
+    session.
+    """
+
+    def __init__(self, token_budget, summary_ratio=0.25, summarizer=None, low_water=0.5):
+        if token_budget <= 0:
+            raise ValueError(f"token预算必须大于0: {token_budget}")
+        if not 0 < low_water <= 1:
+            raise ValueError(f"低水位比例必须在(0, 1]之间: {low_water}")
+        self.token_budget = token_budget
+        self.summary_budget = int(token_budget * summary_ratio)
+        self.low_water = low_water
+        # summarizer(lines) -> str，可替换为基于LLM的摘要；默认按行抽取
+        self.summarizer = summarizer
+        self._tokens = {}
+        self._lines = {}
+        self._summary_key = None
+        self._summary_entry = None
+        # 当前折叠边界：entries[:_boundary] 已并入摘要；_boundary_entry 用于确认仍是同一段历史
+        self._boundary = 0
+        self._boundary_entry = None
+
+    def _entry_tokens(self, entry):
+        entry_id = entry.get("id")
+        tokens = self._tokens.get(entry_id) if entry_id is not None else None
+        if tokens is None:
+            tokens = estimate_tokens(render_entry(entry))
+            if entry_id is not None:
+                self._tokens[entry_id] = tokens
+        return tokens
+
+    def _entry_line(self, entry):
+        entry_id = entry.get("id")
+        line = self._lines.get(entry_id) if entry_id is not None else None
+        if line is None:
+            line = f"[{entry['timestamp']}] {summarize_line(entry['data'])}"
+            if entry_id is not None:
+                self._lines[entry_id] = line
+        return line
+
+    def _pack(self, entries, budget):
+        """Return how many of the newest entries fit in budget (at least one)."""
+        used = 0
+        count = 0
+        for entry in reversed(entries):
+            tokens = self._entry_tokens(entry)
+            if count and used + tokens > budget:
+                break
+            used += tokens
+            count += 1
+        return count
+
+    def _summarize(self, collapsed):
+        last = collapsed[-1]
+        key = (len(collapsed), last.get("id"))
+        if key == self._summary_key and last.get("id") is not None:
+            return self._summary_entry
+
+        lines = [self._entry_line(e) for e in collapsed]
+        if self.summarizer is not None:
+            text = self.summarizer(lines)
+        else:
+            # 摘要同样受预算约束：保留最近的行，更早的只记录条数
+            kept = []
+            used = 0
+            for line in reversed(lines):
+                tokens = estimate_tokens(line) + 1
+                if used + tokens > self.summary_budget:
+                    break
+                kept.append(line)
+                used += tokens
+            kept.reverse()
+            omitted = len(lines) - len(kept)
+            if omitted:
+                kept.insert(0, f"({omitted} earlier entries omitted)")
+            text = "\n".join(kept)
+
+        summary_id = f"summary:{len(collapsed)}:{last.get('id')}" if last.get("id") is not None else None
+        self._summary_key = key
+        self._summary_entry = {"id": summary_id, "timestamp": last["timestamp"], "data": {"summary": text}}
+        logger.debug(f"更新上下文摘要: 折叠条目={len(collapsed)}, 摘要长度={len(text)}")
+        return self._summary_entry
+
+    def _same_boundary(self, entries):
+        boundary = self._boundary
+        if not boundary or len(entries) <= boundary:
+            return False
+        entry, known = entries[boundary - 1], self._boundary_entry
+        return entry is known or (entry.get("id") is not None and entry.get("id") == known.get("id"))
+
+    def _fits(self, entries, budget):
+        used = 0
+        for entry in entries:
+            used += self._entry_tokens(entry)
+            if used > budget:
+                return False
+        return True
+
+    def select(self, entries):
+        """Return the entries (chronological) to render, with older ones folded into a summary."""
+        if not entries:
+            return []
+        recent_budget = self.token_budget - self.summary_budget
+        if self._same_boundary(entries) and self._fits(entries[self._boundary:], recent_budget):
+            # 未再次溢出：沿用上次的折叠边界和摘要，窗口只在末尾追加
+            count = len(entries) - self._boundary
+        else:
+            if self._pack(entries, self.token_budget) == len(entries):
+                self._boundary = 0
+                self._boundary_entry = None
+                return list(entries)
+            # 溢出时折叠到低水位，给后续步骤留出追加的空间
+            count = self._pack(entries, max(1, int(recent_budget * self.low_water)))
+            self._boundary = len(entries) - count
+            self._boundary_entry = entries[self._boundary - 1]
+        collapsed = entries[:len(entries) - count]
+        summary = self._summarize(collapsed)
+        logger.debug("上下文窗口: 保留=%d, 折叠=%d, 预算=%s", count, len(collapsed), self.token_budget)
+        return [summary] + list(entries[len(entries) - count:])
@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+
+
+class _CachedSession:
+    __slots__ = ("entries", "complete")
+
+    def __init__(self, max_entries):
+        # (entry_type, entry) 按时间顺序排列
+        self.entries = deque(maxlen=max_entries)
+        # True 表示缓存中包含该会话的全部条目，可以回答不带 limit 的查询
+        self.complete = True
+
+
+class SessionCache:
+    """LRU cache of decoded context entries, one bounded deque per session.
+
+    Entries are the same dicts returned by ContextManager.get, so callers must
+    treat them as read-only. A session whose deque has overflowed is marked
+    incomplete and can then only serve queries that fit in what is cached.
+    """
+
+    def __init__(self, max_sessions=128, max_entries=1000):
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _put(self, session_id, cached):
+        self._sessions[session_id] = cached
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def start(self, session_id):
+        """Register a brand-new (known empty) session."""
+        with self._lock:
+            self._put(session_id, _CachedSession(self.max_entries))
+
+    def load(self, session_id, rows, complete):
+        """Populate a session from the database; rows are (entry_type, entry) in chronological order."""
+        cached = _CachedSession(self.max_entries)
+        cached.entries.extend(rows)
+        cached.complete = complete and len(rows) <= self.max_entries
+        with self._lock:
+            self._put(session_id, cached)
+
+    def append(self, session_id, entry_type, entry):
+        """Write-through for a session that is already cached; returns False otherwise."""
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is None:
+                return False
+            if len(cached.entries) == cached.entries.maxlen:
+                cached.complete = False
+            cached.entries.append((entry_type, entry))
+            self._sessions.move_to_end(session_id)
+            return True
+
+    def lookup(self, session_id, limit=None, entry_type=None):
+        """Return the newest `limit` entries in chronological order, or None if the cache cannot answer."""
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is None:
+                self.misses += 1
+                return None
+            # 从最新条目向前取，limit 较小时无需遍历整个会话
+            if entry_type:
+                newest_first = (entry for etype, entry in reversed(cached.entries) if etype == entry_type)
+            else:
+                newest_first = (entry for _, entry in reversed(cached.entries))
+            if limit is None:
+                if not cached.complete:
+                    self.misses += 1
+                    return None
+                entries = list(newest_first)
+            else:
+                entries = list(islice(newest_first, max(limit, 0)))
+                if len(entries) < limit and not cached.complete:
+                    self.misses += 1
+                    return None
+            entries.reverse()
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return entries
+
+    def invalidate(self, session_id=None):
+        """Drop one session, or every session when session_id is None."""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
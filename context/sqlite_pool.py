@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from utils.logger import logger
+
+# 每个连接建立时执行的 PRAGMA；WAL + NORMAL 同步让提交不再每次 fsync 主库文件
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -8000,        # 负数表示 KiB，约 8MB 页缓存
+    "mmap_size": 64 * 1024 * 1024,
+    "busy_timeout": 5000,       # 毫秒，多连接并发写时等待而不是立即报 locked
+}
+
+
+class SQLitePool:
+    """Per-thread persistent SQLite connections with tuned pragmas.
+
+    sqlite3 connections must not be shared between threads, so each thread
+    lazily opens one connection and keeps it for the lifetime of the pool.
+    Statement reuse comes from sqlite3's per-connection statement cache,
+    which is keyed by SQL text, so callers should use constant SQL strings.
+    """
+
+    def __init__(self, db_path, pragmas=None, cached_statements=256, timeout=5.0):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,  # 连接只在创建它的线程中使用，关闭时可能来自其他线程
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self._connections.append(conn)
+        logger.debug(f"打开SQLite连接: 路径={self.db_path}, 线程={threading.current_thread().name}")
+        return conn
+
+    def get_connection(self):
+        """Return the calling thread's connection, opening it on first use."""
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"连接池已关闭: {self.db_path}")
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Yield the thread's connection inside a transaction (commit on success, rollback on error)."""
+        conn = self.get_connection()
+        with conn:
+            yield conn
+
+    def close(self):
+        """Close every connection opened by this pool."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._closed = True
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"关闭SQLite连接失败: {str(e)}")
+        self._local = threading.local()
+        logger.debug(f"关闭SQLite连接池: 路径={self.db_path}, 连接数={len(connections)}")
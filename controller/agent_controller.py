@@ -1,103 +1,227 @@
 import asyncio
-from prompt.prompt_generator import generate_prompt
-from parser.response_parser import parse_response
+from prompt.prompt_generator import PromptBuilder
+from context.context_window import ContextWindow
+from parser.response_parser import action_calls, parse_response
+from tools.tool_cache import MISSING
+from tools.tool_registry import ToolRegistry
 from utils.logger import logger
+from utils.metrics import ACTIVE_SESSIONS, ERRORS, SESSION_STEPS, TOOL_SECONDS
+from utils.tracing import span
 import time
 
 class AgentController:
-    def __init__(self, tools, llm_client, context_manager, config):
-        self.tools = tools
+    def __init__(self, tools, llm_client, context_manager, config, tool_cache=None):
+        # 接受工具列表或 ToolRegistry；按名称查找工具是一次字典访问
+        self.tools = tools if isinstance(tools, ToolRegistry) else ToolRegistry(tools)
         self.llm_client = llm_client
         self.context_manager = context_manager
         self.config = config
+        self.tool_cache = tool_cache
         self.running = False
         self.paused = False
         self.current_session_id = None
         logger.debug(f"Agent控制器初始化完成: 工具数量={len(tools)}, 协作模式={config.get('collaboration', False)}")
 
     async def start(self, user_input, context_limit=None):
+        """Run one session to completion and return its summary.
+
+        The session id is local to this run (the shared ContextManager's
+        current session is not touched), so several controllers can run
+        concurrently against one manager.
+        """
         self.running = True
         self.paused = False
         # 创建新会话，重置上下文但保留历史记录
-        self.current_session_id = self.context_manager.new_session()
-        logger.debug(f"创建新会话: ID={self.current_session_id}")
+        session_id = self.context_manager.create_session()
+        self.current_session_id = session_id
+        logger.debug(f"创建新会话: ID={session_id}")
+        # 会话内的各阶段（上下文读写、提示构建、LLM、工具）都记为该span的子span
+        ACTIVE_SESSIONS.inc()
+        try:
+            with span("agent.session", session_id=session_id) as session_span:
+                summary = await self._run_session(session_id, user_input, context_limit)
+                session_span.set(steps=summary["steps"], tokens_used=summary["tokens_used"])
+        finally:
+            ACTIVE_SESSIONS.dec()
+        SESSION_STEPS.observe(summary["steps"])
+        return summary
+
+    async def _run_session(self, session_id, user_input, context_limit):
+        session_start_time = time.time()
+        steps = 0
+        total_tokens = 0
+        prompt_tokens = 0
+        completion_tokens = 0
+        final_result = None
         
         system_prompt = "You are an AI assistant that uses tools to solve tasks."
+        prompt_builder = PromptBuilder(system_prompt, self.tools)
+        # 未请求流式usage时不会有usage到来，提前停止后无需等待
+        usage_grace = self.config.get("parse_usage_grace", 0.5) if self.config.get("llm_stream_usage", True) else 0
+        token_budget = self.config.get("context_token_budget")
+        context_window = None
+        if token_budget:
+            context_window = ContextWindow(token_budget, summary_ratio=self.config.get("context_summary_ratio", 0.25),
+                                           low_water=self.config.get("context_low_water", 0.5))
         logger.debug(f"用户输入: {user_input}")
         logger.info(f"用户指令: {user_input}")
         
         # 记录用户输入到上下文
-        self.context_manager.add({"human_input": user_input}, entry_type="human_input")
+        with span("context.write", entries=1):
+            await self.context_manager.aadd({"human_input": user_input}, entry_type="human_input", session_id=session_id)
         
         while self.running and not self.paused:
             start_time = time.time()
+            steps += 1
             
-            prompt = generate_prompt(system_prompt, user_input, self.tools, self.context_manager.get(context_limit))
-            logger.debug(f"生成提示完成: 长度={len(prompt)}")
-            
-            response_stream = self.llm_client.generate(prompt)
-            decision = await parse_response(response_stream)
-            logger.debug(f"解析响应: {decision}")
-            
-            # 提取元数据（如token消耗）
-            tokens_used = 0
-            if "__metadata__" in decision:
-                metadata = decision.pop("__metadata__")  # 从决策中移除元数据
-                tokens_used = metadata.get("tokens_used", 0)
-                logger.debug(f"本次请求消耗token: {tokens_used}")
-            
-            if decision.get("tool") == "stop":
-                self.running = False
-                result = decision.get("result", "")
-                logger.debug("收到停止指令，完成会话")
-                logger.result(result)
-                self.context_manager.add({"result": result}, entry_type="stop", tokens_used=tokens_used)
-                break
-
-            tool_name = decision.get("tool")
-            tool_input = decision.get("input", "")
-            logger.debug(f"尝试执行工具: {tool_name}, 输入={tool_input}")
-            logger.info(f"执行工具: {tool_name}")
-            
-            tool = next((t for t in self.tools if t.name == tool_name), None)
-
-            if tool:
-                try:
-                    tool_start_time = time.time()
-                    result = tool.execute(tool_input)
-                    tool_elapsed = time.time() - tool_start_time
-                    logger.debug(f"工具执行成功: {tool_name}, 耗时={tool_elapsed:.2f}秒")
-                    logger.result(f"{tool_name} 结果: {result}")
-                    self.context_manager.add(
-                        {"tool": tool_name, "input": tool_input, "result": result},
-                        entry_type="tool_result", 
-                        tokens_used=tokens_used
-                    )
-                except Exception as e:
-                    error_msg = str(e)
-                    logger.error(f"工具执行错误: {tool_name}, 错误={error_msg}")
-                    logger.info(f"错误: {error_msg}")
-                    self.context_manager.add(
-                        {"tool": tool_name, "input": tool_input, "error": error_msg},
-                        entry_type="error",
-                        tokens_used=tokens_used
-                    )
-            else:
-                error_msg = f"工具 '{tool_name}' 未找到"
-                logger.warning(error_msg)
-                logger.info(f"错误: {error_msg}")
-                self.context_manager.add({"error": error_msg}, entry_type="error", tokens_used=tokens_used)
-
-            if self.config.get("collaboration", False):
-                logger.debug("进入协作模式，等待人工输入")
-                human_input = await self._get_human_input()
-                logger.info(f"人工输入: {human_input}")
-                self.context_manager.add({"human_input": human_input}, entry_type="human_input")
-                user_input = human_input  # Update input for next iteration
+            with span("agent.step", step=steps) as step_span:
+                with span("context.read") as read_span:
+                    context = await self.context_manager.aget(context_limit, session_id=session_id)
+                    if context_window is not None:
+                        context = context_window.select(context)
+                    read_span.set(entries=len(context))
+                with span("prompt.build") as build_span:
+                    prompt = prompt_builder.build(user_input, context)
+                    build_span.set(length=len(prompt))
+                logger.debug("生成提示完成: 长度=%d", len(prompt))
+                
+                # 流式生成与解析交错进行；首包与完整流的耗时由 LLMClient 记为子span
+                with span("llm.response"):
+                    response_stream = self.llm_client.generate(prompt, session_id=session_id)
+                    decision = await parse_response(response_stream, early_stop=self.config.get("parse_early_stop", True),
+                                                    usage_grace=usage_grace)
+                logger.debug("解析响应: %s", decision)
+                
+                # 提取元数据（如token消耗）
+                tokens_used = 0
+                usage = {}
+                if "__metadata__" in decision:
+                    metadata = decision.pop("__metadata__")  # 从决策中移除元数据
+                    tokens_used = metadata.get("tokens_used", 0)
+                    usage = {
+                        "prompt_tokens": metadata.get("prompt_tokens", 0),
+                        "completion_tokens": metadata.get("completion_tokens", 0)
+                    }
+                    logger.debug("本次请求消耗token: %s %s 来源=%s", tokens_used, usage, metadata.get('usage_source', 'unknown'))
+                total_tokens += tokens_used
+                prompt_tokens += usage.get("prompt_tokens", 0)
+                completion_tokens += usage.get("completion_tokens", 0)
+                step_span.set(tokens_used=tokens_used)
+                
+                # 一次响应可包含多个相互独立的工具调用，并行执行
+                calls = action_calls(decision)
+                stop_call = next((c for c in calls if c.get("tool") == "stop"), None)
+                tool_calls = [c for c in calls if c.get("tool") != "stop"]
+                if len(tool_calls) > 1:
+                    logger.info(f"并行执行 {len(tool_calls)} 个工具调用")
+                records = list(await asyncio.gather(*(self._run_tool(call) for call in tool_calls)))
+
+                if stop_call is not None:
+                    self.running = False
+                    result = stop_call.get("result", "")
+                    final_result = result
+                    logger.debug("收到停止指令，完成会话")
+                    logger.result(result)
+                    records.append({"data": {"result": result}, "entry_type": "stop"})
+
+                if not records:
+                    records.append({"data": {"error": "响应中没有可执行的动作"}, "entry_type": "error"})
+                # 所有结果一次写入；本次LLM调用的token只记在第一条上，避免重复统计
+                records[0].update(tokens_used=tokens_used, **usage)
+                with span("context.write", entries=len(records)):
+                    await self.context_manager.aadd_many(records, session_id=session_id)
+                if stop_call is not None:
+                    break
+
+                if self.config.get("collaboration", False):
+                    logger.debug("进入协作模式，等待人工输入")
+                    human_input = await self._get_human_input()
+                    logger.info(f"人工输入: {human_input}")
+                    with span("context.write", entries=1):
+                        await self.context_manager.aadd({"human_input": human_input}, entry_type="human_input", session_id=session_id)
+                    user_input = human_input  # Update input for next iteration
             
             elapsed_time = time.time() - start_time
-            logger.debug(f"本轮交互完成: 耗时={elapsed_time:.2f}秒, token消耗={tokens_used}")
-        
+            logger.debug("本轮交互完成: 耗时=%.2f秒, token消耗=%s", elapsed_time, tokens_used)
+
+        # 会话结束时把写后队列中的条目落盘
+        with span("context.flush"):
+            await self.context_manager.aflush()
+
+        elapsed_time = time.time() - session_start_time
+        logger.debug(f"会话结束: ID={session_id}, 步数={steps}, token消耗={total_tokens} (prompt={prompt_tokens}, completion={completion_tokens}), 耗时={elapsed_time:.2f}秒")
+        return {
+            "session_id": session_id,
+            "result": final_result,
+            "steps": steps,
+            "tokens_used": total_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "elapsed": elapsed_time
+        }
+
+    async def _run_tool(self, call):
+        """Execute one tool call and return its context record for add_many()."""
+        tool_name = call.get("tool")
+        tool_input = call.get("input", "")
+        with span("tool", tool=tool_name) as tool_span:
+            start = time.perf_counter()
+            record, cached = await self._execute_tool(tool_name, tool_input)
+            status = "cached" if cached else ("ok" if record["entry_type"] == "tool_result" else "error")
+            # 指标标签只用已注册的工具名，模型编造的名称统一记为 unknown，避免标签无限增长
+            tool_label = tool_name if isinstance(tool_name, str) and tool_name in self.tools else "unknown"
+            TOOL_SECONDS.observe(time.perf_counter() - start, tool=tool_label, status=status)
+            if status == "error":
+                ERRORS.inc(component="tool")
+            tool_span.set(status=status)
+        return record
+
+    async def _execute_tool(self, tool_name, tool_input):
+        """Look up and run a tool; returns (record, whether it came from the result cache)."""
+        logger.debug("尝试执行工具: %s, 输入=%s", tool_name, tool_input)
+        logger.info(f"执行工具: {tool_name}")
+
+        try:
+            tool = self.tools.get(tool_name)
+        except Exception as e:
+            error_msg = f"工具 '{tool_name}' 加载失败: {str(e)}"
+            logger.error(error_msg)
+            return {"data": {"tool": tool_name, "input": tool_input, "error": error_msg}, "entry_type": "error"}, False
+        if tool is None:
+            error_msg = f"工具 '{tool_name}' 未找到"
+            logger.warning(error_msg)
+            logger.info(f"错误: {error_msg}")
+            return {"data": {"error": error_msg}, "entry_type": "error"}, False
+
+        cache_key = None
+        if self.tool_cache is not None and tool.cacheable:
+            try:
+                cache_key = (tool_name, tool.cache_key(tool_input))
+            except Exception as e:
+                logger.debug("工具输入无法作为缓存键: %s, 错误=%s", tool_name, str(e))
+            if cache_key is not None:
+                result = self.tool_cache.get(cache_key)
+                if result is not MISSING:
+                    logger.debug("工具缓存命中: %s, 命中=%d, 未命中=%d", tool_name, self.tool_cache.hits, self.tool_cache.misses)
+                    logger.result(f"{tool_name} 结果(缓存): {result}")
+                    return {"data": {"tool": tool_name, "input": tool_input, "result": result}, "entry_type": "tool_result"}, True
+
+        try:
+            tool_start_time = time.time()
+            # 同步工具由 aexecute 放到线程/进程池执行，不阻塞事件循环和其他会话
+            result = await tool.aexecute(tool_input)
+            tool_elapsed = time.time() - tool_start_time
+            logger.debug("工具执行成功: %s, 耗时=%.2f秒", tool_name, tool_elapsed)
+            # 工具以 {"error": ...} 返回的失败可能是暂时的，不应在之后的会话中重放
+            if cache_key is not None and tool.should_cache(result):
+                self.tool_cache.put(cache_key, result, ttl=tool.cache_ttl)
+            logger.result(f"{tool_name} 结果: {result}")
+            return {"data": {"tool": tool_name, "input": tool_input, "result": result}, "entry_type": "tool_result"}, False
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"工具执行错误: {tool_name}, 错误={error_msg}")
+            logger.info(f"错误: {error_msg}")
+            return {"data": {"tool": tool_name, "input": tool_input, "error": error_msg}, "entry_type": "error"}, False
 
     async def _get_human_input(self):
         # Simulate human input (replace with actual input mechanism)
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+from controller.agent_controller import AgentController
+from utils.logger import logger
+
+
+def load_tasks(path):
+    """Load tasks from a JSONL file.
+
+    Each line is either a JSON string (the user input) or an object with an
+    "input"/"task" field, or "title" + "body" as in requests.jsonl. The task
+    id comes from "id"/"request_id" and falls back to the line number.
+    """
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                tasks.append({"id": str(line_no), "input": item})
+                continue
+            user_input = item.get("input") or item.get("task")
+            if user_input is None:
+                user_input = "\n".join(part for part in (item.get("title"), item.get("body")) if part)
+            if not user_input:
+                raise ValueError(f"第 {line_no} 行缺少任务输入: {path}")
+            task_id = item.get("id") or item.get("request_id") or str(line_no)
+            tasks.append({"id": str(task_id), "input": user_input})
+    logger.debug(f"加载批量任务: 文件={path}, 数量={len(tasks)}")
+    return tasks
+
+
+class BatchRunner:
+    """Run many tasks as independent agent sessions under a concurrency limit.
+
+    Tools, the tool result cache, the LLM client and the ContextManager are shared; every task gets
+    its own AgentController, so run state and session ids never collide.
+    """
+
+    def __init__(self, tools, llm_client, context_manager, config, concurrency=4, tool_cache=None):
+        if concurrency < 1:
+            raise ValueError(f"并发数必须大于0: {concurrency}")
+        self.tools = tools
+        self.llm_client = llm_client
+        self.context_manager = context_manager
+        # 批量运行时无法逐个等待人工输入，强制关闭协作模式
+        self.config = dict(config, collaboration=False)
+        self.concurrency = concurrency
+        self.tool_cache = tool_cache
+
+    async def _run_one(self, semaphore, task, context_limit):
+        async with semaphore:
+            agent = AgentController(self.tools, self.llm_client, self.context_manager, self.config,
+                                    tool_cache=self.tool_cache)
+            start_time = time.time()
+            try:
+                summary = await agent.start(task["input"], context_limit=context_limit)
+                summary["error"] = None
+            except Exception as e:
+                logger.error(f"任务执行失败: ID={task['id']}, 错误={str(e)}")
+                summary = {
+                    "session_id": agent.get_current_session_id(),
+                    "result": None,
+                    "steps": 0,
+                    "tokens_used": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "error": str(e)
+                }
+            summary["task_id"] = task["id"]
+            summary["elapsed"] = time.time() - start_time
+            logger.data(f"任务完成: ID={task['id']}, 会话={summary['session_id']}, "
+                        f"耗时={summary['elapsed']:.2f}秒, token消耗={summary['tokens_used']}")
+            return summary
+
+    async def run(self, tasks, context_limit=None):
+        """Run all tasks and return their summaries in input order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start_time = time.time()
+        results = await asyncio.gather(*(self._run_one(semaphore, task, context_limit) for task in tasks))
+        elapsed_time = time.time() - start_time
+
+        total_tokens = sum(r["tokens_used"] for r in results)
+        failed = sum(1 for r in results if r["error"])
+        throughput = len(results) / elapsed_time if elapsed_time > 0 else 0.0
+        logger.status(f"批量运行完成: 任务数={len(results)}, 失败={failed}, 并发={self.concurrency}, "
+                      f"总耗时={elapsed_time:.2f}秒, 吞吐={throughput:.2f} 任务/秒, 总token={total_tokens}")
+        return results
@@ -0,0 +1,110 @@
+from contextlib import asynccontextmanager
+from tools.tool_base import configure_tool_runtime, shutdown_tool_executors
+from tools.tool_cache import ToolResultCache
+from tools.tool_registry import ToolRegistry
+from llm.response_cache import ResponseCache
+from llm.http_pool import close_clients
+from llm.llm_router import LLMRouter, build_llm_client
+from context.context_manager import ContextManager
+from utils.logger import logger
+from utils.metrics import dump_snapshot, start_metrics_server
+from utils.tracing import configure_tracing, shutdown_tracing
+
+
+class AgentRuntime:
+    """The shared objects an entry point hands to AgentController or BatchRunner."""
+
+    def __init__(self, config):
+        self.config = config
+        self.metrics_server = None
+        self.tools = None
+        self.tool_cache = None
+        self.response_cache = None
+        self.llm_client = None
+        self.context_manager = None
+
+    def _start(self):
+        config = self.config
+        if config["metrics_port"]:
+            self.metrics_server = start_metrics_server(config["metrics_port"], host=config["metrics_host"])
+        configure_tracing(
+            export=config["trace_export"],
+            path=config["trace_path"],
+            endpoint=config["trace_endpoint"]
+        )
+        configure_tool_runtime(
+            executor=config["tool_executor"],
+            workers=config["tool_workers"],
+            timeout=config["tool_timeout"],
+            max_concurrency=config["tool_max_concurrency"]
+        )
+        # 工具在首次调用（或首次渲染提示而未配置描述）时才导入
+        self.tools = ToolRegistry.from_config(config)
+        self.tool_cache = ToolResultCache(config["tool_cache_size"]) if config["tool_cache"] else None
+        logger.debug(f"已注册工具: {self.tools.names()}")
+
+        logger.debug("初始化LLM客户端...")
+        if config["llm_cache"]:
+            self.response_cache = ResponseCache(
+                max_entries=config["llm_cache_size"],
+                ttl=config["llm_cache_ttl"],
+                db_path=config["context_db_path"] if config["llm_cache_persist"] else None
+            )
+        self.llm_client = build_llm_client(config, cache=self.response_cache)
+
+        logger.debug(f"初始化上下文管理器: {config['context_db_path']}")
+        self.context_manager = ContextManager(
+            db_path=config["context_db_path"],
+            write_behind=config["context_write_behind"],
+            flush_size=config["context_flush_size"],
+            flush_interval=config["context_flush_interval"],
+            cache_sessions=config["context_cache_sessions"],
+            cache_entries=config["context_cache_entries"]
+        )
+
+    async def _close(self):
+        # 先落盘上下文，再关闭LLM连接与工具线程池；最后导出追踪和指标
+        try:
+            if self.context_manager is not None:
+                await self.context_manager.aclose()
+        finally:
+            if self.response_cache is not None:
+                logger.data(f"LLM缓存: 命中={self.response_cache.hits}, 未命中={self.response_cache.misses}")
+                self.response_cache.close()
+            if self.tool_cache is not None:
+                logger.data(f"工具缓存: 命中={self.tool_cache.hits}, 未命中={self.tool_cache.misses}")
+            if isinstance(self.llm_client, LLMRouter):
+                for endpoint_stats in self.llm_client.stats():
+                    logger.data(f"LLM端点: {endpoint_stats}")
+                await self.llm_client.aclose()
+            await close_clients()
+            shutdown_tool_executors()
+            shutdown_tracing()
+
+            logger.status("\n=== 性能指标 ===")
+            dump_snapshot(self.config["metrics_dump"])
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+
+
+@asynccontextmanager
+async def agent_runtime(config):
+    """Build the tools, LLM client, caches and context store from config, and tear them down on exit.
+
+    Teardown runs even when the body raises: pending context writes are
+    flushed first, then clients, tool executors, tracing and the metrics
+    endpoint are closed and the log queue is drained.
+    """
+    if config["log_queue"]:
+        # 日志输出交给后台线程，事件循环不再阻塞在 stdout/文件写入上
+        logger.start_queue()
+    runtime = AgentRuntime(config)
+    try:
+        runtime._start()
+        yield runtime
+    finally:
+        try:
+            await runtime._close()
+        finally:
+            # 排空日志队列，之后的 print 不会与日志交错
+            logger.stop_queue()
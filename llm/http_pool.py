@@ -0,0 +1,93 @@
+import threading
+import httpx
+from openai import AsyncOpenAI
+from utils.logger import logger
+
+DEFAULT_HTTP_OPTIONS = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,   # 秒，空闲连接保留时长
+    "timeout": 60.0,            # 秒，读/写/连接池等待的超时
+    "connect_timeout": 10.0,
+    "http2": False,
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def http_options_from_config(config):
+    """Map the llm_* transport keys of a ConfigLoader config onto get_client options."""
+    return {
+        "max_connections": config["llm_max_connections"],
+        "max_keepalive_connections": config["llm_max_keepalive"],
+        "keepalive_expiry": config["llm_keepalive_expiry"],
+        "timeout": config["llm_timeout"],
+        "connect_timeout": config["llm_connect_timeout"],
+        "http2": config["llm_http2"],
+    }
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_http_client(options):
+    http2 = options["http2"]
+    if http2 and not _http2_available():
+        logger.warning("未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1 (pip install httpx[http2])")
+        http2 = False
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=options["max_connections"],
+            max_keepalive_connections=options["max_keepalive_connections"],
+            keepalive_expiry=options["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(options["timeout"], connect=options["connect_timeout"]),
+        http2=http2,
+    )
+
+
+def get_client(api_base_url, api_key, http_options=None):
+    """Return the process-wide AsyncOpenAI client for this endpoint, creating it on first use.
+
+    Clients are keyed by base URL, API key and transport options, so every
+    LLMClient talking to the same endpoint shares one connection pool.
+    """
+    options = dict(DEFAULT_HTTP_OPTIONS)
+    if http_options:
+        options.update(http_options)
+    key = (api_base_url or None, api_key, tuple(sorted(options.items())))
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = _build_http_client(options)
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=api_base_url if api_base_url else None,  # Use default OpenAI URL if not specified
+                http_client=http_client,
+                timeout=http_client.timeout,
+                max_retries=0,  # 重试由 LLMClient 统一处理，避免两层重试叠加
+            )
+            _clients[key] = client
+            logger.debug(f"创建共享HTTP客户端: API基础URL={api_base_url or '默认OpenAI URL'}, "
+                         f"最大连接数={options['max_connections']}, keep-alive={options['max_keepalive_connections']}, "
+                         f"HTTP/2={options['http2']}")
+    return client
+
+
+async def close_clients():
+    """Close every shared client and its connections; call once at shutdown."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"关闭HTTP客户端失败: {str(e)}")
+    logger.debug(f"已关闭共享HTTP客户端: 数量={len(clients)}")
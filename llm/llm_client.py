@@ -1,55 +1,352 @@
-from openai import AsyncOpenAI
+import asyncio
+import random
+from collections import deque
+import openai
 from utils.logger import logger
+from utils.metrics import ERRORS, LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from utils.tracing import record_span
+from llm.http_pool import get_client
+from llm.llm_stream import LLMStream
+from llm.response_cache import request_key
+from utils.token_counter import estimate_tokens
 import time
 
+SYSTEM_PROMPT = "You are an AI assistant."
+
+# 这些HTTP状态码通常是暂时性的，值得重试
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# 自适应对冲至少需要这么多首包延迟样本才计算p95
+HEDGE_MIN_SAMPLES = 20
+
+
+class LLMTimeoutError(TimeoutError):
+    """The first chunk or a following chunk did not arrive within its timeout."""
+
+
+def is_retryable(error):
+    """Whether a failed attempt may succeed if repeated."""
+    if isinstance(error, (LLMTimeoutError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_options_from_config(config):
+    """Map the llm_* timeout/retry/hedging keys of a ConfigLoader config onto LLMClient kwargs."""
+    return {
+        "first_token_timeout": config["llm_first_token_timeout"],
+        "chunk_timeout": config["llm_chunk_timeout"],
+        "max_retries": config["llm_max_retries"],
+        "backoff_base": config["llm_backoff_base"],
+        "backoff_max": config["llm_backoff_max"],
+        "hedge": config["llm_hedge"],
+        "hedge_delay": config["llm_hedge_delay"],
+    }
+
+
 class LLMClient:
-    def __init__(self, api_base_url, api_key, model):
+    def __init__(self, api_base_url, api_key, model, stream_usage=True, sampling_params=None, cache=None,
+                 http_options=None, first_token_timeout=None, chunk_timeout=None,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, hedge=False, hedge_delay=None,
+                 rate_limiter=None, completion_reserve=256):
         logger.debug(f"初始化LLM客户端: 模型={model}, API基础URL={api_base_url or '默认OpenAI URL'}")
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=api_base_url if api_base_url else None  # Use default OpenAI URL if not specified
-        )
+        # 同一端点的所有 LLMClient 共享一个 AsyncOpenAI 客户端及其连接池
+        self.client = get_client(api_base_url, api_key, http_options)
         self.model = model
+        # 请求在流的最后一个块中返回usage；不支持 stream_options 的服务可关闭
+        self.stream_usage = stream_usage
+        # temperature、top_p 等采样参数，原样传给API，同时参与缓存键
+        self.sampling_params = dict(sampling_params or {})
+        # 可选的 ResponseCache，相同请求直接回放缓存的片段
+        self.cache = cache
+        # 超时（秒，None 表示不限）：首个片段到达前，以及相邻片段之间
+        self.first_token_timeout = first_token_timeout
+        self.chunk_timeout = chunk_timeout
+        # 首个片段到达前的失败按指数退避（带抖动）重试；已输出内容后不再重试
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 对冲：首包超过 hedge_delay（None 为近期首包延迟的p95）仍未到达时并发第二个请求
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self._first_token_latencies = deque(maxlen=200)
+        # 可选的 RateLimiter（通常由 get_limiter 按端点+模型共享）；每次调用预留
+        # 提示估算 + completion_reserve 个token，完成后按实际用量结算
+        self.rate_limiter = rate_limiter
+        self.completion_reserve = completion_reserve
+
+    def generate(self, prompt, session_id=None):
+        """Start a streamed completion.
+
+        Returns an LLMStream: iterate it for content chunks (followed by one
+        {"__metadata__": ...} item); its `text` and `usage` are available
+        afterwards without re-reading the stream. With a cache configured, a
+        repeated request is replayed from the cache; a replay reports its
+        (zero) usage item before the content instead of after it. Only
+        streams read to their end are cached, not cancelled ones. session_id
+        only decides the caller's place in the rate limiter's fair queue.
+        """
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            **self.sampling_params,
+            "stream": True
+        }
+        if self.stream_usage:
+            request["stream_options"] = {"include_usage": True}
+        prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt)
+        if self.cache is not None:
+            source = self._cached_stream(request, prompt_tokens, session_id)
+        else:
+            source = self._stream(request, prompt_tokens, session_id)
+        return LLMStream(source, prompt_tokens=prompt_tokens, model=self.model)
+
+    async def _cached_stream(self, request, prompt_tokens_estimate, session_id=None):
+        key = request_key(request)
+        lookup_start = time.perf_counter()
+        cached = await self.cache.aget(key)
+        record_span("llm.cache", lookup_start, hit=cached is not None)
+        if cached is not None:
+            chunks, _ = cached
+            logger.debug("LLM缓存命中: 键=%s, 片段数=%d", key[:12], len(chunks))
+            # 命中不产生API调用，token消耗记为0；元数据先于内容发出，
+            # 解析器提前停止时也能拿到它
+            yield {"__metadata__": {
+                "tokens_used": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "usage_source": "cache",
+                "model": self.model
+            }}
+            for chunk in chunks:
+                yield chunk
+            return
+
+        chunks = []
+        stream = self._stream(request, prompt_tokens_estimate, session_id)
+        try:
+            async for item in stream:
+                if isinstance(item, dict) and "__metadata__" in item:
+                    # _stream 读完整个响应后才发出元数据，此时写入缓存；被提前取消的流
+                    # 没有元数据，其前缀回放给不提前停止的调用方会是残缺的响应，不缓存
+                    await self.cache.aput(key, chunks, item["__metadata__"])
+                else:
+                    chunks.append(item)
+                yield item
+        finally:
+            await stream.aclose()
+
+    def _current_hedge_delay(self):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if len(self._first_token_latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self._first_token_latencies)
+        return samples[int(len(samples) * 0.95) - 1]
 
-    async def generate(self, prompt):
-        logger.debug(f"发送请求到LLM: 模型={self.model}, 提示长度={len(prompt)}")
+    def _backoff(self, attempt):
+        # 等抖动：一半固定，一半随机，避免并发请求同时重试
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    async def _attempt(self, request):
+        """Send the request and wait for its first chunk; returns (response, iterator, first_chunk)."""
+        response = await self.client.chat.completions.create(**request)
+        iterator = response.__aiter__()
+        try:
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await response.close()
+            raise
+        return response, iterator, first
+
+    async def _timed_attempt(self, request):
+        if self.first_token_timeout is None:
+            return await self._attempt(request)
+        try:
+            return await asyncio.wait_for(self._attempt(request), self.first_token_timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"首个片段超时: {self.first_token_timeout}秒") from None
+
+    async def _discard(self, tasks):
+        """Cancel losing attempts and close any response that completed anyway."""
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, tuple):
+                await result[0].close()
+
+    async def _hedged_attempt(self, request):
+        delay = self._current_hedge_delay() if self.hedge else None
+        primary = asyncio.create_task(self._timed_attempt(request))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            # 对冲不能突破限额：没有余量时继续等待原请求
+            return await primary
+        logger.debug(f"首包超过 {delay:.2f}秒，发送对冲请求")
+        pending = {primary, asyncio.create_task(self._timed_attempt(request))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    # 取最先返回的一个，其余（含同时完成的）全部丢弃
+                    pending |= set(winners[1:])
+                    return winners[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            if pending:
+                await self._discard(pending)
+
+    async def _connect(self, request, session_id=None):
+        """Open a stream that has produced its first chunk, retrying transient failures."""
+        attempt = 0
+        while True:
+            start_time = time.time()
+            try:
+                result = await self._hedged_attempt(request)
+                self._first_token_latencies.append(time.time() - start_time)
+                return result
+            except Exception as e:
+                if self.rate_limiter is not None and isinstance(e, openai.RateLimitError):
+                    self.rate_limiter.penalize()
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                logger.warning(f"LLM请求失败，{delay:.2f}秒后第 {attempt} 次重试: {str(e)}")
+                await asyncio.sleep(delay)
+                if self.rate_limiter is not None:
+                    # 重试同样占用请求配额；token已在首次放行时预留
+                    await self.rate_limiter.acquire(0, session_id)
+
+    async def _next_chunk(self, iterator):
+        if self.chunk_timeout is None:
+            return await iterator.__anext__()
+        try:
+            return await asyncio.wait_for(iterator.__anext__(), self.chunk_timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"片段间隔超时: {self.chunk_timeout}秒") from None
+
+    async def _stream(self, request, prompt_tokens_estimate, session_id=None):
+        prompt = request["messages"][-1]["content"]
+        logger.debug("发送请求到LLM: 模型=%s, 提示长度=%d", self.model, len(prompt))
         logger.api(f"开始请求LLM: 模型={self.model}")
         start_time = time.time()
-        
+        stream_start = time.perf_counter()
+        reserved = 0
+        if self.rate_limiter is not None:
+            reserved = prompt_tokens_estimate + self.completion_reserve
+            await self.rate_limiter.acquire(reserved, session_id)
+            record_span("llm.rate_limit", stream_start, tokens=reserved)
+
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=True
-            )
-            
-            total_tokens = 0
-            progress_marks = [25, 50, 75, 100]  # 用于记录进度的标记点（token数）
+            connect_start = time.perf_counter()
+            try:
+                response, iterator, chunk = await self._connect(request, session_id)
+            except Exception as e:
+                record_span("llm.first_token", connect_start, error=str(e), model=self.model)
+                if reserved:
+                    # 请求未成功，预留的token退回
+                    self.rate_limiter.settle(reserved, 0)
+                raise
+            # 含重试与对冲；span均以单调时钟计时
+            record_span("llm.first_token", connect_start, model=self.model)
+            LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - connect_start, model=self.model)
             
-            full_content = ""
+            chunk_count = 0
+            contents = []
+            usage = None
+            progress_marks = [25, 50, 75, 100]  # 用于记录进度的标记点（片段数）
+            completed = False
+            failed = False
             
-            async for chunk in response:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    full_content += content
-                    total_tokens += 1
-                    
-                    # 仅在开发环境或到达标记点时记录进度
-                    if total_tokens in progress_marks:
-                        logger.data(f"LLM响应进度: 已生成 {total_tokens} tokens")
+            try:
+                while chunk is not None:
+                    # 开启 include_usage 后，最后一个块的 choices 为空，只携带 usage
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        contents.append(content)
+                        chunk_count += 1
                         
-                    yield content
+                        # 仅在开发环境或到达标记点时记录进度
+                        if chunk_count in progress_marks:
+                            logger.data(f"LLM响应进度: 已接收 {chunk_count} 个片段")
+                            
+                        yield content
+                    try:
+                        chunk = await self._next_chunk(iterator)
+                    except StopAsyncIteration:
+                        chunk = None
+                completed = True
+            except Exception:
+                failed = True
+                raise
+            finally:
+                if not completed:
+                    # 调用方提前结束（如解析器已拿到决策）或片段超时，关闭连接以停止生成
+                    await response.close()
+                    completion_estimate = estimate_tokens("".join(contents))
+                    if reserved:
+                        self.rate_limiter.settle(reserved, prompt_tokens_estimate + completion_estimate)
+                    LLM_TOKENS.inc(prompt_tokens_estimate, model=self.model, kind="prompt")
+                    LLM_TOKENS.inc(completion_estimate, model=self.model, kind="completion")
+                    logger.debug("LLM响应提前结束: 已接收 %d 个片段, 耗时=%.2f秒", chunk_count, time.time() - start_time)
+                    record_span("llm.stream", stream_start, model=self.model, chunks=chunk_count, completed=False)
+                    if not failed:
+                        # 失败在外层统计，这里只记调用方主动取消的请求
+                        LLM_REQUEST_SECONDS.observe(time.perf_counter() - stream_start, model=self.model, outcome="cancelled")
             
+            if usage is not None:
+                prompt_tokens = usage.prompt_tokens or 0
+                completion_tokens = usage.completion_tokens or 0
+                usage_source = "api"
+            else:
+                logger.debug("LLM响应未包含usage，使用本地估算")
+                prompt_tokens = prompt_tokens_estimate
+                completion_tokens = estimate_tokens("".join(contents))
+                usage_source = "estimate"
+            tokens_used = prompt_tokens + completion_tokens
+            if reserved:
+                self.rate_limiter.settle(reserved, tokens_used)
+            record_span("llm.stream", stream_start, model=self.model, chunks=chunk_count, completed=True,
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, usage_source=usage_source)
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - stream_start, model=self.model, outcome="completed")
+            LLM_TOKENS.inc(prompt_tokens, model=self.model, kind="prompt")
+            LLM_TOKENS.inc(completion_tokens, model=self.model, kind="completion")
+
             elapsed_time = time.time() - start_time
-            logger.debug(f"LLM响应完成: 耗时={elapsed_time:.2f}秒, 生成tokens={total_tokens}")
-            logger.success(f"LLM响应完成: 共生成 {total_tokens} tokens, 耗时 {elapsed_time:.2f}秒")
+            logger.debug("LLM响应完成: 耗时=%.2f秒, 片段数=%d, prompt=%d, completion=%d, 来源=%s",
+                         elapsed_time, chunk_count, prompt_tokens, completion_tokens, usage_source)
+            logger.success("LLM响应完成: 共消耗 %d tokens (生成 %d), 耗时 %.2f秒", tokens_used, completion_tokens, elapsed_time)
             
             # 返回额外元数据，包括token消耗
-            yield {"__metadata__": {"tokens_used": total_tokens, "model": self.model}}
+            yield {"__metadata__": {
+                "tokens_used": tokens_used,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "usage_source": usage_source,
+                "model": self.model
+            }}
             
         except Exception as e:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - stream_start, model=self.model, outcome="error")
+            ERRORS.inc(component="llm")
             logger.error(f"LLM调用错误: {str(e)}")
             raise
\ No newline at end of file
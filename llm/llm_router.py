@@ -0,0 +1,230 @@
+import asyncio
+import random
+import time
+import openai
+from llm.http_pool import http_options_from_config
+from llm.llm_client import SYSTEM_PROMPT, LLMClient, is_retryable, retry_options_from_config
+from llm.llm_stream import LLMStream
+from llm.rate_limiter import get_limiter
+from utils.logger import logger
+from utils.token_counter import estimate_tokens
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+
+class Endpoint:
+    """One backend behind the router, with its load and health state."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.outstanding = 0
+        self.ewma = None            # 首个片段延迟的指数加权平均（秒）
+        self.failures = 0           # 连续失败次数
+        self.opened_at = None       # 熔断打开的时间，None 表示闭合
+        self.trial = False          # 半开状态下是否已有一个试探请求在途
+        self.requests = 0
+        self.errors = 0
+
+    def available(self, now, cooldown):
+        if self.opened_at is None:
+            return True
+        # 冷却期过后进入半开：只放行一个试探请求
+        return now - self.opened_at >= cooldown and not self.trial
+
+    def stats(self):
+        return {
+            "endpoint": self.name,
+            "model": self.client.model,
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "circuit": "closed" if self.opened_at is None else "open",
+        }
+
+
+class LLMRouter:
+    """Spread generate() calls over several LLMClients with the same interface.
+
+    Each call goes to the available endpoint with the fewest requests in
+    flight ("least_outstanding") or the lowest EWMA first-chunk latency
+    weighted by its in-flight count ("ewma"). An endpoint that fails
+    failure_threshold times in a row is taken out for `cooldown` seconds and
+    then re-admitted with a single trial request; API errors that are not
+    retryable (e.g. 401, 404) count towards this too. A retryable failure
+    before any content was produced fails over to the next endpoint.
+    """
+
+    def __init__(self, clients, strategy="least_outstanding", failure_threshold=3, cooldown=30.0,
+                 ewma_alpha=0.3, health_interval=None):
+        if not clients:
+            raise ValueError("路由器至少需要一个端点")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"无效的路由策略: {strategy}. 必须是 {STRATEGIES} 之一")
+        self.endpoints = [Endpoint(client, f"{i}:{client.model}") for i, client in enumerate(clients)]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        # 主动健康检查间隔（秒）；None 表示只依靠真实请求的成败判断健康
+        self.health_interval = health_interval
+        self._health_task = None
+        logger.debug(f"初始化LLM路由器: 端点数={len(self.endpoints)}, 策略={strategy}")
+
+    @property
+    def model(self):
+        return self.endpoints[0].client.model
+
+    def _pick(self, exclude):
+        now = time.time()
+        candidates = [e for e in self.endpoints if e not in exclude and e.available(now, self.cooldown)]
+        if not candidates:
+            return None
+        if self.strategy == "ewma":
+            # 尚无延迟样本的端点按已知端点的平均延迟计，避免突发请求全部涌向它
+            known = [e.ewma for e in self.endpoints if e.ewma is not None]
+            default = sum(known) / len(known) if known else 0.0
+
+            def score(e):
+                latency = e.ewma if e.ewma is not None else default
+                return (latency * (e.outstanding + 1), e.outstanding, random.random())
+        else:
+            def score(e):
+                return (e.outstanding, random.random())
+        endpoint = min(candidates, key=score)
+        if endpoint.opened_at is not None:
+            endpoint.trial = True
+            logger.debug(f"端点半开试探: {endpoint.name}")
+        return endpoint
+
+    def _record_success(self, endpoint, latency):
+        if endpoint.ewma is None:
+            endpoint.ewma = latency
+        else:
+            endpoint.ewma += self.ewma_alpha * (latency - endpoint.ewma)
+        if endpoint.opened_at is not None:
+            logger.info(f"端点恢复: {endpoint.name}")
+        endpoint.failures = 0
+        endpoint.opened_at = None
+        endpoint.trial = False
+
+    def _record_failure(self, endpoint, error):
+        endpoint.errors += 1
+        endpoint.failures += 1
+        if endpoint.opened_at is not None:
+            # 半开试探失败，重新计时
+            endpoint.opened_at = time.time()
+            endpoint.trial = False
+        elif endpoint.failures >= self.failure_threshold:
+            endpoint.opened_at = time.time()
+            logger.warning(f"端点熔断: {endpoint.name}, 连续失败={endpoint.failures}, 冷却={self.cooldown}秒")
+
+    def generate(self, prompt, session_id=None):
+        """Same contract as LLMClient.generate, served by one of the endpoints."""
+        if self.health_interval and self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+        prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt)
+        return LLMStream(self._route(prompt, session_id), prompt_tokens=prompt_tokens, model=self.model)
+
+    async def _route(self, prompt, session_id):
+        tried = set()
+        last_error = None
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                if last_error is not None:
+                    raise last_error
+                raise RuntimeError("没有可用的LLM端点（全部熔断中）")
+            tried.add(endpoint)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            stream = endpoint.client.generate(prompt, session_id=session_id)
+            start_time = time.time()
+            started = False
+            try:
+                async for item in stream:
+                    if not started:
+                        started = True
+                        self._record_success(endpoint, time.time() - start_time)
+                    yield item
+                return
+            except Exception as e:
+                if not is_retryable(e):
+                    if isinstance(e, openai.APIError):
+                        # 401/404/400 多半是端点配置错误（密钥、模型名），同样计入熔断，
+                        # 否则该端点会一直接收首选流量；错误本身不换端点重试
+                        self._record_failure(endpoint, e)
+                    raise
+                self._record_failure(endpoint, e)
+                if started:
+                    raise
+                last_error = e
+                logger.warning(f"端点请求失败，切换端点: {endpoint.name}, 错误={str(e)}")
+            finally:
+                endpoint.outstanding -= 1
+                if endpoint.opened_at is not None:
+                    # 试探请求未得出结论（被取消或非API错误），允许下一个试探
+                    endpoint.trial = False
+                await stream.aclose()
+
+    async def acheck_health(self):
+        """Probe endpoints whose circuit is open; a successful probe closes it."""
+        for endpoint in self.endpoints:
+            if endpoint.opened_at is None:
+                continue
+            try:
+                await endpoint.client.client.models.list()
+            except Exception as e:
+                logger.debug(f"健康检查失败: {endpoint.name}, 错误={str(e)}")
+                continue
+            endpoint.failures = 0
+            endpoint.opened_at = None
+            endpoint.trial = False
+            logger.info(f"健康检查通过，端点恢复: {endpoint.name}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.acheck_health()
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def stats(self):
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+
+def build_llm_client(config, cache=None):
+    """Build the LLM client described by a ConfigLoader config.
+
+    Returns a plain LLMClient, or an LLMRouter when llm_endpoints lists more
+    backends. Endpoint entries may override api_base_url, api_key, model and
+    the rpm/tpm limits; missing fields fall back to the top-level settings.
+    """
+    def make_client(endpoint):
+        api_base_url = endpoint.get("api_base_url", config["api_base_url"])
+        model = endpoint.get("model", config["model"])
+        limiter = get_limiter(api_base_url, model,
+                              requests_per_minute=endpoint.get("rpm", config["llm_rpm"]),
+                              tokens_per_minute=endpoint.get("tpm", config["llm_tpm"]),
+                              burst_seconds=config["llm_rate_burst"])
+        return LLMClient(api_base_url, endpoint.get("api_key", config["api_key"]), model,
+                         stream_usage=config["llm_stream_usage"], cache=cache,
+                         http_options=http_options_from_config(config),
+                         rate_limiter=limiter, completion_reserve=config["llm_completion_reserve"],
+                         **retry_options_from_config(config))
+
+    endpoints = config.get("llm_endpoints") or []
+    if not endpoints:
+        return make_client({})
+    clients = [make_client(e) for e in endpoints]
+    return LLMRouter(
+        clients,
+        strategy=config["llm_router_strategy"],
+        failure_threshold=config["llm_circuit_failures"],
+        cooldown=config["llm_circuit_cooldown"],
+        health_interval=config["llm_health_interval"]
+    )
@@ -0,0 +1,62 @@
+from utils.token_counter import estimate_tokens
+
+
+class LLMStream:
+    """Async iterator over a streamed completion that keeps what it has yielded.
+
+    Content chunks are collected in a list and joined once, on first access to
+    `text`, so long completions cost O(n) however many chunks they arrive in.
+    The {"__metadata__": ...} item (last, or first for a cache replay) is
+    passed through unchanged and also exposed as `metadata`.
+    """
+
+    def __init__(self, source, prompt_tokens=0, model=None):
+        self._source = source
+        # 流被提前取消时不会收到API的usage，用本地估算兜底
+        self.prompt_tokens = prompt_tokens
+        self.model = model
+        self.chunks = []
+        self.metadata = None
+        self._text = None
+        self._text_chunks = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._source.__anext__()
+        if isinstance(item, dict) and "__metadata__" in item:
+            self.metadata = item["__metadata__"]
+        else:
+            self.chunks.append(item)
+        return item
+
+    async def aclose(self):
+        """Stop the underlying stream early (e.g. once the action has been parsed)."""
+        await self._source.aclose()
+
+    @property
+    def text(self):
+        """All content received so far."""
+        if self._text is None or self._text_chunks != len(self.chunks):
+            self._text = "".join(self.chunks)
+            self._text_chunks = len(self.chunks)
+        return self._text
+
+    @property
+    def usage(self):
+        """Token usage from the metadata item.
+
+        Before the metadata arrives (e.g. the stream was cancelled early) this
+        is a local estimate over the prompt and the content received so far.
+        """
+        if self.metadata is not None:
+            return self.metadata
+        completion_tokens = estimate_tokens(self.text)
+        return {
+            "tokens_used": self.prompt_tokens + completion_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "usage_source": "estimate",
+            "model": self.model,
+        }
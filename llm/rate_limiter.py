@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from utils.logger import logger
+
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Refills at `rate` units per second up to `capacity`; the balance may go negative after settling."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        # 超过容量的请求最多等到桶满，否则永远无法放行
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute admission control for one endpoint/model.
+
+    Callers wait in a queue per session and sessions are served round-robin,
+    so one busy session cannot starve the others. Each admission reserves an
+    estimated token count; settle() corrects the bucket with the real usage
+    once it is known. burst_seconds sets how much unused quota may build up.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst_seconds=10.0, name=""):
+        self.name = name
+        self.requests = None
+        self.tokens = None
+        if requests_per_minute:
+            rate = requests_per_minute / 60.0
+            self.requests = TokenBucket(rate, max(1.0, rate * burst_seconds))
+        if tokens_per_minute:
+            rate = tokens_per_minute / 60.0
+            self.tokens = TokenBucket(rate, max(1.0, rate * burst_seconds))
+        self._queues = OrderedDict()    # session_id -> deque[(future, tokens)]
+        self._dispatcher = None
+        self.waited = 0
+
+    def _delay(self, tokens):
+        delay = 0.0
+        if self.requests is not None:
+            delay = self.requests.delay(1)
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.delay(tokens))
+        return delay
+
+    def _consume(self, tokens):
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None and tokens:
+            self.tokens.consume(tokens)
+
+    def try_acquire(self, tokens=0):
+        """Admit immediately if nobody is queued and quota is available; never waits."""
+        if self._queues or self._delay(tokens) > 0:
+            return False
+        self._consume(tokens)
+        return True
+
+    async def acquire(self, tokens=0, session_id=None):
+        """Wait until one request and `tokens` tokens are available, in fair order."""
+        if self.try_acquire(tokens):
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(session_id, deque())
+        queue.append((future, tokens))
+        self.waited += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        logger.debug("限流排队: %s, 会话=%s, 排队会话数=%d", self.name, session_id, len(self._queues))
+        await future
+
+    async def _dispatch(self):
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            future, tokens = queue[0]
+            if future.done():
+                # 调用方已取消
+                queue.popleft()
+            else:
+                delay = self._delay(tokens)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                self._consume(tokens)
+                queue.popleft()
+                future.set_result(None)
+            # 轮转到下一个会话
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+
+    def settle(self, reserved, actual):
+        """Replace a reservation with the tokens actually used."""
+        if self.tokens is not None:
+            self.tokens.tokens += reserved - actual
+
+    def penalize(self):
+        """The provider answered 429: empty the buckets so admissions pause until they refill."""
+        if self.requests is not None:
+            self.requests.drain()
+        if self.tokens is not None:
+            self.tokens.drain()
+        logger.debug(f"收到429，暂停放行: {self.name}")
+
+
+def get_limiter(api_base_url, model, requests_per_minute=None, tokens_per_minute=None, burst_seconds=10.0):
+    """Return the process-wide limiter for this endpoint and model, or None when no limit is set.
+
+    Every LLMClient for the same endpoint/model shares it, so the quota holds
+    across agents and routers in the process.
+    """
+    if not requests_per_minute and not tokens_per_minute:
+        return None
+    key = (api_base_url or None, model)
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            name = f"{api_base_url or '默认OpenAI URL'}/{model}"
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute, burst_seconds, name=name)
+            _limiters[key] = limiter
+            logger.debug(f"创建限流器: {name}, RPM={requests_per_minute}, TPM={tokens_per_minute}")
+    return limiter
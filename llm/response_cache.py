@@ -0,0 +1,134 @@
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from context.sqlite_pool import SQLitePool
+from utils.logger import logger
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        chunks TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+"""
+SELECT_SQL = "SELECT chunks, metadata, created_at FROM llm_cache WHERE key = ?"
+UPSERT_SQL = "INSERT OR REPLACE INTO llm_cache (key, model, chunks, metadata, created_at) VALUES (?, ?, ?, ?, ?)"
+DELETE_SQL = "DELETE FROM llm_cache WHERE key = ?"
+
+
+def request_key(request):
+    """Hash of everything that determines a completion: model, messages and sampling parameters."""
+    # 传输相关的参数不影响生成内容
+    material = {k: v for k, v in request.items() if k not in ("stream", "stream_options")}
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of streamed completions, optionally backed by SQLite.
+
+    A value is the list of content chunks as they arrived plus the usage
+    metadata of the original call, so a hit can be replayed as a stream.
+    The memory tier is checked first; with db_path set, misses fall through
+    to an llm_cache table and hits are promoted into memory. Disk access runs
+    on a dedicated thread so callers on the event loop never block on it.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._pool = None
+        self._executor = None
+        if db_path:
+            self._pool = SQLitePool(db_path)
+            with self._pool.connection() as conn:
+                conn.execute(CREATE_TABLE_SQL)
+            # 单线程执行器：SQLite 连接按线程复用
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache-db")
+        logger.debug(f"初始化LLM响应缓存: 容量={max_entries}, TTL={ttl}秒, 数据库={db_path or '无'}")
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _get_memory(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                return None
+            if self._expired(value[2]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put_memory(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_disk(self, key):
+        with self._pool.connection() as conn:
+            row = conn.execute(SELECT_SQL, (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[2]):
+                conn.execute(DELETE_SQL, (key,))
+                return None
+        return json.loads(row[0]), json.loads(row[1]), row[2]
+
+    def _put_disk(self, key, value):
+        chunks, metadata, created_at = value
+        with self._pool.connection() as conn:
+            conn.execute(UPSERT_SQL, (key, metadata.get("model") or "", json.dumps(chunks),
+                                      json.dumps(metadata), created_at))
+
+    async def _run_in_db_thread(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def aget(self, key):
+        """Return (chunks, metadata) for a live entry, or None."""
+        value = self._get_memory(key)
+        if value is None and self._pool is not None:
+            try:
+                value = await self._run_in_db_thread(self._get_disk, key)
+            except Exception as e:
+                logger.warning(f"读取LLM缓存失败: {str(e)}")
+                value = None
+            if value is not None:
+                self._put_memory(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value[0], value[1]
+
+    async def aput(self, key, chunks, metadata):
+        """Store a completion; a failed disk write only costs the persistent copy."""
+        value = (list(chunks), dict(metadata), time.time())
+        self._put_memory(key, value)
+        if self._pool is not None:
+            try:
+                await self._run_in_db_thread(self._put_disk, key, value)
+            except Exception as e:
+                logger.warning(f"写入LLM缓存失败: {str(e)}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._pool is not None:
+            self._pool.close()
@@ -1,11 +1,8 @@
 import asyncio
-import os
 from dotenv import load_dotenv
 from pathlib import Path
-from tools.calculator import CalculatorTool
-from llm.llm_client import LLMClient
-from context.context_manager import ContextManager
 from controller.agent_controller import AgentController
+from controller.runtime import agent_runtime
 from config.config_loader import ConfigLoader
 from utils.logger import logger
 from utils.debug_tools import is_dev_mode, memory_usage
@@ -20,13 +17,7 @@ else:
 
 async def main():
     logger.debug("正在初始化配置...")
-    config = ConfigLoader(
-        model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
-        api_key=os.getenv("OPENAI_API_KEY", "your-openai-api-key"),  # Fallback for testing
-        api_base_url=os.getenv("OPENAI_API_BASE_URL", None),  # None uses OpenAI default
-        collaboration=os.getenv("COLLABORATION", "False").lower() == "true",
-        context_db_path=os.getenv("CONTEXT_DB_PATH", "context.db")
-    ).get()
+    config = ConfigLoader.from_env().get()
     
     logger.debug(f"配置已加载: 模型={config['model']}, API基础URL={config['api_base_url']}, " +
                  f"协作模式={config['collaboration']}, 上下文数据库路径={config['context_db_path']}")
@@ -42,47 +33,44 @@ async def main():
         if memory_mb:
             logger.data(f"初始内存使用: {memory_mb:.2f} MB")
 
-    tools = [CalculatorTool()]
-    logger.debug(f"已加载工具: {[tool.name for tool in tools]}")
-    logger.info(f"加载工具: {', '.join([tool.name for tool in tools])}")
-    
-    logger.debug("初始化LLM客户端...")
-    llm_client = LLMClient(config["api_base_url"], config["api_key"], config["model"])
-    
-    logger.debug(f"初始化上下文管理器: {config['context_db_path']}")
-    context_manager = ContextManager(db_path=config["context_db_path"])
-    
-    logger.debug("初始化Agent控制器...")
-    agent = AgentController(tools, llm_client, context_manager, config)
+    async with agent_runtime(config) as runtime:
+        context_manager = runtime.context_manager
+        logger.info(f"注册工具: {', '.join(runtime.tools.names())}")
 
-    # 第一次启动 agent
-    logger.status("\n=== 开始第一个会话 ===")
-    await agent.start("Calculate 3 + 2")
-    logger.data(f"当前会话 ID: {agent.get_current_session_id()}")
+        logger.debug("初始化Agent控制器...")
+        agent = AgentController(runtime.tools, runtime.llm_client, context_manager, config,
+                                tool_cache=runtime.tool_cache)
 
-    # # 第二次启动 agent（新会话）
-    # logger.info("\n=== 开始第二个会话 ===")
-    # await agent.start("Calculate 10 * 5")
-    # logger.info(f"当前会话 ID: {agent.get_current_session_id()}")
+        # 第一次启动 agent
+        logger.status("\n=== 开始第一个会话 ===")
+        await agent.start("Calculate 3 + 2")
+        logger.data(f"当前会话 ID: {agent.get_current_session_id()}")
 
-    # # 打印所有会话
-    logger.status("\n=== 所有会话列表 ===")
-    sessions = context_manager.get_sessions()
-    for idx, session_id in enumerate(sessions, 1):
-        logger.user(f"{idx}. {session_id}")
+        # # 第二次启动 agent（新会话）
+        # logger.info("\n=== 开始第二个会话 ===")
+        # await agent.start("Calculate 10 * 5")
+        # logger.info(f"当前会话 ID: {agent.get_current_session_id()}")
+
+        # # 打印所有会话
+        logger.status("\n=== 所有会话列表 ===")
+        sessions = await context_manager.aget_sessions()
+        for idx, session_id in enumerate(sessions, 1):
+            logger.user(f"{idx}. {session_id}")
+
+        # # 回放所有会话的上下文历史
+        logger.status("\n=== 回放所有会话上下文历史 ===")
+        context_manager.replay()
+        
+        # 展示token消耗统计
+        logger.status("\n=== Token消耗统计 ===")
+        token_stats = await context_manager.aget_token_usage()
+        logger.data(f"总Token消耗: {token_stats['total_tokens']} "
+                    f"(prompt={token_stats['prompt_tokens']}, completion={token_stats['completion_tokens']})")
+        
+        for session_id, usage in token_stats['session_usage'].items():
+            logger.data(f"会话 {session_id}: {usage['total_tokens']} tokens "
+                        f"(prompt={usage['prompt_tokens']}, completion={usage['completion_tokens']})")
 
-    # # 回放所有会话的上下文历史
-    logger.status("\n=== 回放所有会话上下文历史 ===")
-    context_manager.replay()
-    
-    # 展示token消耗统计
-    logger.status("\n=== Token消耗统计 ===")
-    token_stats = context_manager.get_token_usage()
-    logger.data(f"总Token消耗: {token_stats['total_tokens']}")
-    
-    for session_id, tokens in token_stats['sessions'].items():
-        logger.data(f"会话 {session_id}: {tokens} tokens")
-    
     logger.success("Mixlab Agent 运行完成")
 
  
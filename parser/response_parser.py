@@ -1,32 +1,211 @@
+import asyncio
 import json
+import re
+from utils.logger import logger
 
-async def parse_response(response_stream):
-    full_response = ""
+# 解析器只关心这几个字符，其余文本直接跳过
+_SPECIAL_CHARS = re.compile(r'[{}"\\]')
+
+
+class StreamingJSONParser:
+    """Find top-level JSON objects in a text stream as the chunks arrive.
+
+    Tracks brace depth and string/escape state across chunk boundaries, so
+    nested objects and braces inside strings are handled. Text outside an
+    object (the model's prose) is skipped. Each character is looked at once
+    and an object's text is joined only when it closes.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self._parts = []
+
+    def feed(self, chunk):
+        """Consume a chunk and return the text of every top-level object that closed in it."""
+        completed = []
+        start = 0 if self.depth else None
+        pos = 0
+        if self.escape and chunk:
+            # 上一个块以反斜杠结尾，跳过被转义的字符
+            self.escape = False
+            pos = 1
+        length = len(chunk)
+        while True:
+            match = _SPECIAL_CHARS.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            char = chunk[i]
+            pos = i + 1
+            if self.in_string:
+                if char == "\\":
+                    if pos < length:
+                        pos += 1
+                    else:
+                        self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    start = i
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._parts.append(chunk[start:pos])
+                    completed.append("".join(self._parts))
+                    self._parts = []
+                    start = None
+        if self.depth and start is not None:
+            self._parts.append(chunk[start:])
+        return completed
+
+    def pending(self):
+        """Text of the top-level object that is still open, from its "{" on."""
+        return "".join(self._parts)
+
+
+def _scan_objects(text):
+    """Decode each JSON object in text that starts at some "{", skipping over the ones found.
+
+    Unlike StreamingJSONParser this does not trust brace depth, so a "{"
+    that never closes only costs one failed decode.
+    """
+    decoder = json.JSONDecoder()
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pos = text.find("{", pos + 1)
+            continue
+        yield obj
+        pos = text.find("{", end)
+
+
+def is_action(obj):
+    """A single {"tool": ...} call, or {"actions": [...]} with at least one such call."""
+    if not isinstance(obj, dict):
+        return False
+    if "tool" in obj:
+        return True
+    actions = obj.get("actions")
+    return (isinstance(actions, list) and bool(actions)
+            and all(isinstance(a, dict) and "tool" in a for a in actions))
+
+
+def action_calls(decision):
+    """The tool calls of a decision as a list, whichever form the model used.
+
+    Anything that is not a valid action (e.g. a fallback object or an empty
+    "actions" list) comes back as a single call, which the controller
+    reports as an unknown tool instead of failing.
+    """
+    if is_action(decision) and "tool" not in decision:
+        return [a for a in decision["actions"] if isinstance(a, dict)]
+    return [decision]
+
+
+async def _wait_for_metadata(response_stream, timeout):
+    """Keep reading (without parsing) until the metadata item; None if the stream ends, fails or times out first."""
+    async def drain():
+        async for chunk in response_stream:
+            if isinstance(chunk, dict) and "__metadata__" in chunk:
+                return chunk["__metadata__"]
+        return None
+    try:
+        return await asyncio.wait_for(drain(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    except Exception as e:
+        # 决策已经拿到，尾部读取失败只影响用量统计
+        logger.debug(f"等待usage时流出错: {str(e)}")
+        return None
+
+
+async def parse_response(response_stream, early_stop=True, usage_grace=0.5):
+    """Extract the action object from a streamed LLM response.
+
+    The action is a top-level JSON object with a "tool" key, or with an
+    "actions" list of such calls to run in parallel. With early_stop
+    the first such object is returned as soon as it closes; the rest of the
+    stream is then read without parsing for up to usage_grace seconds, so the
+    usage the API sends after the content is still recorded, and cancelled if
+    it has not ended by then. Otherwise the whole stream is read and the last
+    one wins. If the stream ends inside an unclosed "{" (e.g. a set written in
+    prose) without a decision, the text after it is scanned again object by
+    object, so an action it swallowed is still found.
+    """
+    parser = StreamingJSONParser()
     metadata = None
-    
+    decision = None
+    fallback = None
+    parse_error = None
+    chunk_count = 0
+    stopped_early = False
+
     async for chunk in response_stream:
         # 检查是否为元数据字典
         if isinstance(chunk, dict) and "__metadata__" in chunk:
             metadata = chunk["__metadata__"]
             continue
-            
-        full_response += chunk
-        # Publish chunk to subscribers (e.g., UI or logs) if needed
-        # print(f"Streamed chunk: {chunk}")  # Placeholder for info publishing
-    
-    # Extract JSON from the end of the response (assuming LLM outputs <action>JSON</action>)
-    start = full_response.rfind("{")
-    end = full_response.rfind("}") + 1
-    json_str = full_response[start:end]
 
-    try:
-        result = json.loads(json_str)
-        # 将元数据添加到结果中但不影响原始响应内容
-        if metadata:
-            result["__metadata__"] = metadata
-        return result
-    except json.JSONDecodeError as e:
-        result = {"error": f"Failed to parse JSON: {str(e)}"}
-        if metadata:
-            result["__metadata__"] = metadata
-        return result
\ No newline at end of file
+        chunk_count += 1
+        for text in parser.feed(chunk):
+            try:
+                obj = json.loads(text)
+            except json.JSONDecodeError as e:
+                parse_error = e
+                continue
+            if is_action(obj):
+                decision = obj
+                if early_stop:
+                    break
+            elif isinstance(obj, dict):
+                fallback = obj
+        if decision is not None and early_stop:
+            stopped_early = True
+            break
+
+    if decision is None and parser.depth:
+        # 正文中未闭合的 "{" 会把其后的动作当作自身内容吞掉，在剩余文本中逐个重新查找
+        for obj in _scan_objects(parser.pending()):
+            if is_action(obj):
+                decision = obj
+                if early_stop:
+                    break
+            elif isinstance(obj, dict):
+                fallback = obj
+
+    if stopped_early and metadata is None and usage_grace:
+        # 开启 include_usage 时 usage 在内容之后才到，短暂等待它以记录API的真实用量
+        metadata = await _wait_for_metadata(response_stream, usage_grace)
+        stopped_early = metadata is None
+
+    if stopped_early:
+        # 已拿到决策，取消剩余的生成
+        aclose = getattr(response_stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        if metadata is None:
+            # 取消后收不到API的usage：优先用流自带的估算，否则退回片段数
+            usage = getattr(response_stream, "usage", None)
+            metadata = dict(usage) if usage else {"tokens_used": chunk_count}
+            metadata["stream_cancelled"] = True
+
+    result = decision if decision is not None else fallback
+    if result is None:
+        reason = str(parse_error) if parse_error else "no JSON object found in response"
+        result = {"error": f"Failed to parse JSON: {reason}"}
+    # 将元数据添加到结果中但不影响原始响应内容
+    if metadata:
+        result["__metadata__"] = metadata
+    return result
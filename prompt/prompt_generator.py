@@ -1,12 +1,86 @@
+THOUGHT_AND_ACTION = """<thought>Determine the next action based on the input and context. If the request has been fully addressed or the desired result has been obtained, return a "stop" action and the result.</thought>
+<action>Return a JSON object: {"tool": "tool_name", "input": "input_data"} or {"tool": "stop"，"result": "result_data"}. To run several independent tool calls at once, return {"actions": [{"tool": "tool_name", "input": "input_data"}, ...]}</action>
+"""
+
+
+def render_tool(name, description):
+    return f"<tool name='{name}'>{description}</tool>"
+
+
+def render_tools(tools):
+    if hasattr(tools, "render"):
+        # ToolRegistry 缓存渲染结果，且无需导入提供了描述的工具
+        return tools.render()
+    return "\n".join([render_tool(t.name, t.description) for t in tools])
+
+
+def render_entry(entry):
+    return f"<entry timestamp='{entry['timestamp']}'>{entry['data']}</entry>"
+
+
 def generate_prompt(system_prompt, user_input, tools, context):
-    tools_desc = "\n".join([f"<tool name='{t.name}'>{t.description}</tool>" for t in tools])
-    context_str = "\n".join([f"<entry timestamp='{c['timestamp']}'>{c['data']}</entry>" for c in context])
+    tools_desc = render_tools(tools)
+    context_str = "\n".join([render_entry(c) for c in context])
     prompt = f"""
 <system>{system_prompt}</system>
 <user>{user_input}</user>
 <tools>{tools_desc}</tools>
 <context>{context_str}</context>
-<thought>Determine the next action based on the input and context. If the request has been fully addressed or the desired result has been obtained, return a "stop" action and the result.</thought>
-<action>Return a JSON object: {{"tool": "tool_name", "input": "input_data"}} or {{"tool": "stop"，"result": "result_data"}}</action>
-"""
-    return prompt
\ No newline at end of file
+{THOUGHT_AND_ACTION}"""
+    return prompt
+
+
+class PromptBuilder:
+    """Builds the same prompt as generate_prompt, incrementally across steps.
+
+    The system prompt and tools block are rendered once. Each context entry is
+    rendered once and reused while it stays in the window, matched by entry
+    object or by entry id. When a step's context is the previous step's
+    context plus new entries, only the new ones are rendered and appended to
+    the cached context string.
+    """
+
+    def __init__(self, system_prompt, tools):
+        self._system_block = f"\n<system>{system_prompt}</system>\n<user>"
+        self._tools_block = f"</user>\n<tools>{render_tools(tools)}</tools>\n<context>"
+        self._footer = f"</context>\n{THOUGHT_AND_ACTION}"
+        self._entries = []
+        self._ids = []
+        self._parts = []
+        self._context_str = ""
+
+    def _extends_previous(self, context):
+        known = len(self._entries)
+        if not known or len(context) < known:
+            return False
+        for new, old, old_id in zip(context, self._entries, self._ids):
+            if new is not old and (old_id is None or new.get("id") != old_id):
+                return False
+        return True
+
+    def _update_context(self, context):
+        if self._extends_previous(context):
+            # 仅渲染并追加新条目
+            new_parts = [render_entry(c) for c in context[len(self._entries):]]
+            if new_parts:
+                self._context_str += "\n" + "\n".join(new_parts)
+                self._parts.extend(new_parts)
+        else:
+            by_object = {id(e): part for e, part in zip(self._entries, self._parts)}
+            by_id = {i: part for i, part in zip(self._ids, self._parts) if i is not None}
+            parts = []
+            for c in context:
+                part = by_object.get(id(c))
+                if part is None:
+                    part = by_id.get(c.get("id"))
+                if part is None:
+                    part = render_entry(c)
+                parts.append(part)
+            self._parts = parts
+            self._context_str = "\n".join(parts)
+        self._entries = list(context)
+        self._ids = [c.get("id") for c in context]
+
+    def build(self, user_input, context):
+        self._update_context(context)
+        return f"{self._system_block}{user_input}{self._tools_block}{self._context_str}{self._footer}"
@@ -10,10 +10,22 @@ def main():
     parser.add_argument("--end-time", help="End timestamp (ISO format)")
     parser.add_argument("--session", help="Filter by session ID")
     parser.add_argument("--list-sessions", action="store_true", help="List all available session IDs")
+    parser.add_argument("--after-id", type=int, help="Only show entries with an id greater than this (resume point)")
+    parser.add_argument("--page-size", type=int, default=500, help="Rows fetched per database round trip")
+    parser.add_argument("--follow", action="store_true", help="Keep running and print new entries as they are written")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls with --follow")
     args = parser.parse_args()
 
     context_manager = ContextManager()
+    try:
+        run(context_manager, args)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        context_manager.close()
 
+
+def run(context_manager, args):
     if args.list_sessions:
         sessions = context_manager.get_sessions()
         if sessions:
@@ -22,22 +34,27 @@ def main():
                 print(f"{idx}. {session_id}")
         else:
             print("No sessions found.")
-        return
-    
-    if args.replay:
+    elif args.replay:
         print("Replaying context history:")
-        context_manager.replay(limit=args.limit, entry_type=args.entry_type, session_id=args.session)
+        context_manager.replay(limit=args.limit, entry_type=args.entry_type, session_id=args.session,
+                               after_id=args.after_id, chunk_size=args.page_size,
+                               follow=args.follow, poll_interval=args.poll_interval)
     else:
         print("Querying context:")
         entries = context_manager.query(
             start_time=args.start_time,
             end_time=args.end_time,
             entry_type=args.entry_type,
-            session_id=args.session
+            session_id=args.session,
+            after_id=args.after_id,
+            limit=args.limit,
+            chunk_size=args.page_size,
+            follow=args.follow,
+            poll_interval=args.poll_interval
         )
         for entry in entries:
             session_info = f" [Session: {entry['session_id']}]" if 'session_id' in entry else ""
-            print(f"[{entry['timestamp']}]{session_info} {entry['data']}")
+            print(f"[{entry['timestamp']}]{session_info} {entry['data']}", flush=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
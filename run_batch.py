@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from dotenv import load_dotenv
+from controller.batch_runner import BatchRunner, load_tasks
+from controller.runtime import agent_runtime
+from config.config_loader import ConfigLoader
+from utils.logger import logger
+
+env_path = Path("local") / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+
+
+async def run(args):
+    config = ConfigLoader.from_env().get()
+    tasks = load_tasks(args.tasks)
+    logger.status(f"开始批量运行: 任务数={len(tasks)}, 并发={args.concurrency}")
+
+    async with agent_runtime(config) as runtime:
+        runner = BatchRunner(runtime.tools, runtime.llm_client, runtime.context_manager, config,
+                             concurrency=args.concurrency, tool_cache=runtime.tool_cache)
+        results = await runner.run(tasks, context_limit=args.context_limit)
+
+    for r in results:
+        status = f"错误: {r['error']}" if r["error"] else f"结果: {r['result']}"
+        print(f"[{r['task_id']}] 会话={r['session_id']} 步数={r['steps']} "
+              f"耗时={r['elapsed']:.2f}s tokens={r['tokens_used']} {status}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+        print(f"结果已写入: {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a batch of tasks as concurrent agent sessions.")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of sessions running at once")
+    parser.add_argument("--context-limit", type=int, help="Limit the number of context entries per prompt")
+    parser.add_argument("--output", help="Write per-session results to this JSONL file")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from controller.agent_controller import AgentController
+from tools.tool_base import Tool
+from tools.tool_cache import ToolResultCache
+from utils.metrics import TOOL_SECONDS
+
+
+class FlakyTool(Tool):
+    """Fails on its first call, then succeeds."""
+
+    cacheable = True
+    executor = "inline"
+
+    def __init__(self):
+        self.calls = 0
+
+    @property
+    def name(self):
+        return "flaky"
+
+    @property
+    def description(self):
+        return "test tool"
+
+    def execute(self, input_data):
+        self.calls += 1
+        if self.calls == 1:
+            return {"error": "temporarily unavailable"}
+        return {"result": input_data}
+
+
+class ToolCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tool = FlakyTool()
+        self.cache = ToolResultCache()
+        self.controller = AgentController([self.tool], None, None, {}, tool_cache=self.cache)
+
+    def execute(self):
+        return asyncio.run(self.controller._execute_tool("flaky", "x"))
+
+    def test_error_result_is_not_served_from_cache(self):
+        record, cached = self.execute()
+        self.assertEqual(record["data"]["result"], {"error": "temporarily unavailable"})
+        self.assertFalse(cached)
+        self.assertEqual(len(self.cache), 0)
+
+        record, cached = self.execute()
+        self.assertEqual(record["data"]["result"], {"result": "x"})
+        self.assertFalse(cached)
+
+        record, cached = self.execute()
+        self.assertEqual(record["data"]["result"], {"result": "x"})
+        self.assertTrue(cached)
+        self.assertEqual(self.tool.calls, 2)
+
+    def test_tool_can_refuse_caching(self):
+        self.tool.should_cache = lambda result: False
+        self.tool.calls = 1
+        self.execute()
+        self.execute()
+        self.assertEqual(self.tool.calls, 3)
+        self.assertEqual(len(self.cache), 0)
+
+
+class ToolMetricsTest(unittest.TestCase):
+    def test_unknown_tool_names_share_one_label(self):
+        controller = AgentController([FlakyTool()], None, None, {})
+        for name in ("flaky", "made_up_tool", "another_one", ["not", "a", "name"]):
+            asyncio.run(controller._run_tool({"tool": name, "input": "x"}))
+        labels = {value["labels"]["tool"] for value in TOOL_SECONDS.snapshot()}
+        self.assertIn("flaky", labels)
+        self.assertIn("unknown", labels)
+        self.assertNotIn("made_up_tool", labels)
+        self.assertNotIn("another_one", labels)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from context.context_manager import ContextManager
+
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "context.db")
+        # 刷新间隔足够长，只在测试显式调用或关闭时写入
+        self.manager = ContextManager(self.db_path, write_behind=True, flush_size=1000, flush_interval=60)
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def db_rows(self):
+        reader = ContextManager(self.db_path, cache_sessions=0)
+        try:
+            return reader.get(all_sessions=True)
+        finally:
+            reader.close()
+
+    def test_flush_backfills_ids(self):
+        self.manager.add({"n": 0})
+        self.manager.add_many([{"data": {"n": 1}}, {"data": {"n": 2}, "entry_type": "tool_result"}])
+        cached = self.manager.get()
+        self.assertEqual([e["id"] for e in cached], [None, None, None])
+
+        self.assertEqual(self.manager.flush(), 3)
+        rows = self.db_rows()
+        self.assertEqual([e["id"] for e in cached], [e["id"] for e in rows])
+        self.assertEqual(self.manager.get(), rows)
+
+    def test_order_is_kept_across_flushes(self):
+        self.manager.add({"n": 0})
+        self.manager.flush()
+        self.manager.add({"n": 1})
+        self.manager.add_many([{"data": {"n": 2}}, {"data": {"n": 3}}])
+        self.manager.add({"n": 4})
+        self.assertEqual([e["data"]["n"] for e in self.manager.get()], [0, 1, 2, 3, 4])
+
+        self.manager.close()
+        rows = self.db_rows()
+        self.assertEqual([e["data"]["n"] for e in rows], [0, 1, 2, 3, 4])
+        ids = [e["id"] for e in rows]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_queued_async_adds_are_written_by_aclose(self):
+        async def run():
+            tasks = [asyncio.ensure_future(self.manager.aadd({"n": i})) for i in range(200)]
+            await asyncio.sleep(0)
+            await self.manager.aclose()
+            await asyncio.gather(*tasks)
+        asyncio.run(run())
+        self.assertEqual(len(self.db_rows()), 200)
+
+    def test_add_after_close_raises(self):
+        self.manager.close()
+        with self.assertRaises(RuntimeError):
+            self.manager.add({"n": 0})
+        with self.assertRaises(RuntimeError):
+            self.manager.add_many([{"data": {"n": 0}}])
+        self.assertEqual(self.db_rows(), [])
+
+    def test_failed_final_flush_is_reported(self):
+        self.manager.add({"n": 0})
+        self.manager.add({"n": 1})
+        pool = self.manager._pool
+        with mock.patch.object(pool, "connection", side_effect=OSError("disk full")), \
+                mock.patch.object(pool, "close", wraps=pool.close) as close_pool, \
+                self.assertLogs("mixlab-agent", "WARNING") as logs:
+            with self.assertRaises(OSError):
+                self.manager.close()
+        close_pool.assert_called_once()
+        self.assertTrue(any("2 条条目未落盘" in line for line in logs.output))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from context.context_window import ContextWindow
+from prompt.prompt_generator import PromptBuilder
+
+
+def make_entry(i):
+    return {"id": i, "timestamp": "t", "data": {"tool": "calculator", "input": "x" * 40, "result": "y" * 120}}
+
+
+class ContextWindowTest(unittest.TestCase):
+    def test_fits_without_summary(self):
+        entries = [make_entry(i) for i in range(3)]
+        self.assertEqual(ContextWindow(10000).select(entries), entries)
+
+    def test_summary_is_kept_until_the_window_overflows_again(self):
+        window = ContextWindow(600)
+        builder = PromptBuilder("system", [])
+        entries = []
+        summaries = set()
+        appended = 0
+        for i in range(60):
+            entries.append(make_entry(i))
+            context = window.select(entries)
+            if "summary" in context[0]["data"]:
+                summaries.add(context[0]["id"])
+            appended += builder._extends_previous(context)
+            builder.build("task", context)
+            self.assertEqual(context[-1], entries[-1])
+        self.assertLessEqual(len(summaries), 15)
+        self.assertGreaterEqual(appended, 40)
+
+    def test_new_history_resets_the_boundary(self):
+        window = ContextWindow(600)
+        window.select([make_entry(i) for i in range(30)])
+        entries = [make_entry(i) for i in range(100, 103)]
+        self.assertEqual(window.select(entries), entries)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from llm.llm_client import LLMClient
+from llm.response_cache import ResponseCache
+from parser.response_parser import parse_response
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.client = LLMClient("http://127.0.0.1:9/v1", "test-key", "stub-model", cache=ResponseCache())
+        self.calls = 0
+
+        async def fake_stream(request, prompt_tokens_estimate, session_id=None):
+            self.calls += 1
+            yield '{"tool": "stop", "result": "ok"}'
+            await asyncio.sleep(self.tail_delay)
+            yield " and more text"
+            yield {"__metadata__": {"tokens_used": 10, "usage_source": "api"}}
+        self.client._stream = fake_stream
+
+    def run_twice(self, **kwargs):
+        async def run():
+            first = await parse_response(self.client.generate("hi"), **kwargs)
+            replay = self.client.generate("hi")
+            second = await parse_response(replay, early_stop=False)
+            return first, second, replay.text
+        return asyncio.run(run())
+
+    def test_cancelled_stream_is_not_cached(self):
+        self.tail_delay = 0.5
+        first, _, text = self.run_twice(usage_grace=0.05)
+        self.assertTrue(first["__metadata__"]["stream_cancelled"])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(text, '{"tool": "stop", "result": "ok"} and more text')
+
+    def test_completed_stream_is_replayed_in_full(self):
+        self.tail_delay = 0
+        _, second, text = self.run_twice()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second["__metadata__"]["usage_source"], "cache")
+        self.assertEqual(text, '{"tool": "stop", "result": "ok"} and more text')
+
+
+if __name__ == "__main__":
+    unittest.main()
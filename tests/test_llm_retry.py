@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+import httpx
+import openai
+from llm.llm_client import LLMClient
+
+REQUEST = httpx.Request("POST", "http://127.0.0.1:9/v1/chat/completions")
+
+
+def status_error(cls, code):
+    return cls("stub error", response=httpx.Response(code, request=REQUEST), body=None)
+
+
+class FakeResponse:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAttemptsTestCase(unittest.TestCase):
+    def make_client(self, outcomes, **kwargs):
+        """outcomes: per attempt, an exception to raise or (delay, name) to return after delay."""
+        client = LLMClient("http://127.0.0.1:9/v1", "test-key", "stub-model", backoff_base=0, **kwargs)
+        self.attempts = []
+        self.responses = []
+
+        async def attempt(request):
+            index = len(self.attempts)
+            self.attempts.append(index)
+            outcome = outcomes[index]
+            if isinstance(outcome, Exception):
+                raise outcome
+            delay, name = outcome
+            await asyncio.sleep(delay)
+            response = FakeResponse(name)
+            self.responses.append(response)
+            return response, None, name
+        client._attempt = attempt
+        return client
+
+    def connect(self, client):
+        return asyncio.run(client._connect({}))
+
+
+class RetryTest(FakeAttemptsTestCase):
+    def test_transient_errors_are_retried_in_order(self):
+        client = self.make_client([
+            openai.APIConnectionError(request=REQUEST),
+            status_error(openai.InternalServerError, 503),
+            (0, "ok"),
+        ], max_retries=2)
+        self.assertEqual(self.connect(client)[2], "ok")
+        self.assertEqual(self.attempts, [0, 1, 2])
+
+    def test_gives_up_after_max_retries(self):
+        client = self.make_client([status_error(openai.InternalServerError, 503)] * 3, max_retries=1)
+        with self.assertRaises(openai.InternalServerError):
+            self.connect(client)
+        self.assertEqual(len(self.attempts), 2)
+
+    def test_non_retryable_error_is_raised_at_once(self):
+        client = self.make_client([status_error(openai.AuthenticationError, 401), (0, "ok")], max_retries=3)
+        with self.assertRaises(openai.AuthenticationError):
+            self.connect(client)
+        self.assertEqual(len(self.attempts), 1)
+
+    def test_first_token_timeout_is_retried(self):
+        client = self.make_client([(1, "slow"), (0, "ok")], max_retries=1, first_token_timeout=0.05)
+        self.assertEqual(self.connect(client)[2], "ok")
+
+
+class HedgeTest(FakeAttemptsTestCase):
+    def test_hedge_wins_when_primary_is_slow(self):
+        client = self.make_client([(0.5, "primary"), (0, "hedge")], hedge=True, hedge_delay=0.05)
+        self.assertEqual(self.connect(client)[2], "hedge")
+        self.assertEqual(self.attempts, [0, 1])
+
+    def test_no_hedge_when_primary_is_fast(self):
+        client = self.make_client([(0, "primary"), (0, "hedge")], hedge=True, hedge_delay=0.5)
+        self.assertEqual(self.connect(client)[2], "primary")
+        self.assertEqual(self.attempts, [0])
+
+    def test_loser_that_completes_is_closed(self):
+        # 对冲请求发出时两个请求同时完成：只返回一个，另一个的连接被关闭
+        client = self.make_client([], hedge=True, hedge_delay=0.01)
+
+        async def run():
+            both_sent = asyncio.Event()
+
+            async def attempt(request):
+                self.attempts.append(len(self.attempts))
+                if len(self.attempts) == 2:
+                    both_sent.set()
+                await both_sent.wait()
+                response = FakeResponse(len(self.attempts))
+                self.responses.append(response)
+                return response, None, None
+            client._attempt = attempt
+            return await client._connect({})
+        winner = asyncio.run(run())[0]
+        self.assertEqual(len(self.responses), 2)
+        self.assertFalse(winner.closed)
+        self.assertTrue(all(r.closed for r in self.responses if r is not winner))
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        client = self.make_client([(0.2, "primary"), status_error(openai.AuthenticationError, 401)],
+                                  hedge=True, hedge_delay=0.05)
+        self.assertEqual(self.connect(client)[2], "primary")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+import httpx
+import openai
+from llm.llm_router import LLMRouter
+
+REQUEST = httpx.Request("POST", "http://127.0.0.1:9/v1/chat/completions")
+
+
+class FakeClient:
+    def __init__(self, model, error=None):
+        self.model = model
+        self.error = error
+        self.calls = 0
+
+    def generate(self, prompt, session_id=None):
+        async def stream():
+            self.calls += 1
+            if self.error is not None:
+                raise self.error
+            yield "ok"
+        return stream()
+
+
+class CircuitTest(unittest.TestCase):
+    def collect(self, router):
+        async def run():
+            return [item async for item in router.generate("hi")]
+        return asyncio.run(run())
+
+    def test_non_retryable_errors_open_the_circuit(self):
+        unauthorized = openai.AuthenticationError(
+            "bad key", response=httpx.Response(401, request=REQUEST), body=None)
+        broken = FakeClient("broken", error=unauthorized)
+        healthy = FakeClient("healthy")
+        router = LLMRouter([broken, healthy], failure_threshold=2, cooldown=60)
+        # 让坏端点始终是首选：请求都先落到它上面
+        router._pick = lambda exclude, pick=router._pick: pick(exclude | {router.endpoints[1]}) or pick(exclude)
+
+        for _ in range(2):
+            with self.assertRaises(openai.AuthenticationError):
+                self.collect(router)
+        self.assertEqual(router.stats()[0]["circuit"], "open")
+        self.assertEqual(router.stats()[0]["errors"], 2)
+
+        self.assertEqual(self.collect(router), ["ok"])
+        self.assertEqual(broken.calls, 2)
+        self.assertEqual(healthy.calls, 1)
+
+    def test_other_exceptions_do_not_count(self):
+        router = LLMRouter([FakeClient("a", error=ValueError("bug"))], failure_threshold=1)
+        with self.assertRaises(ValueError):
+            self.collect(router)
+        self.assertEqual(router.stats()[0]["circuit"], "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from unittest import mock
+from llm.rate_limiter import RateLimiter, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch("llm.rate_limiter.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = TokenBucket(rate=2.0, capacity=4.0)
+
+    def test_refills_at_rate_up_to_capacity(self):
+        self.bucket.consume(4)
+        self.assertEqual(self.bucket.delay(1), 0.5)
+        self.now += 1
+        self.assertEqual(self.bucket.delay(2), 0.0)
+        self.assertEqual(self.bucket.delay(4), 1.0)
+        self.now += 100
+        self.bucket.consume(0)
+        self.assertEqual(self.bucket.tokens, 4.0)
+
+    def test_request_larger_than_capacity_waits_for_a_full_bucket(self):
+        self.bucket.consume(4)
+        self.assertEqual(self.bucket.delay(1000), 2.0)
+
+    def test_settle_and_penalize(self):
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+        self.assertTrue(limiter.try_acquire(50))
+        limiter.settle(50, 80)
+        self.assertEqual(limiter.tokens.tokens, limiter.tokens.capacity - 80)
+        limiter.penalize()
+        self.assertEqual(limiter.tokens.tokens, 0)
+        self.assertEqual(limiter.requests.tokens, 0)
+        self.assertFalse(limiter.try_acquire())
+
+
+class FairnessTest(unittest.TestCase):
+    def test_sessions_are_served_round_robin(self):
+        # 每秒200个请求、桶容量为1：除第一个外都要排队
+        limiter = RateLimiter(requests_per_minute=12000, burst_seconds=0.001)
+        order = []
+
+        async def request(session_id, index):
+            await limiter.acquire(session_id=session_id)
+            order.append(f"{session_id}{index}")
+
+        async def run():
+            busy = [asyncio.ensure_future(request("a", i)) for i in range(6)]
+            await asyncio.sleep(0)
+            quiet = [asyncio.ensure_future(request("b", i)) for i in range(2)]
+            await asyncio.gather(*busy, *quiet)
+        asyncio.run(run())
+        self.assertEqual(order, ["a0", "a1", "b0", "a2", "b1", "a3", "a4", "a5"])
+
+    def test_cancelled_waiter_is_skipped(self):
+        limiter = RateLimiter(requests_per_minute=12000, burst_seconds=0.001)
+
+        async def run():
+            await limiter.acquire(session_id="a")
+            waiter = asyncio.ensure_future(limiter.acquire(session_id="a"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.wait_for(limiter.acquire(session_id="b"), 1)
+            return waiter.cancelled()
+        self.assertTrue(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from parser.response_parser import action_calls, parse_response
+
+
+def parse(chunks, early_stop=True):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+    result = asyncio.run(parse_response(stream(), early_stop=early_stop))
+    result.pop("__metadata__", None)
+    return result
+
+
+class ParseResponseTest(unittest.TestCase):
+    def test_action_split_across_chunks(self):
+        result = parse(['Thinking {"to', 'ol": "calculator", "input": "{1}"}', " done"])
+        self.assertEqual(result, {"tool": "calculator", "input": "{1}"})
+
+    def test_unclosed_brace_in_prose_does_not_swallow_the_action(self):
+        for early_stop in (True, False):
+            result = parse(["set {1, 2 then ", '{"tool":"stop","result":"ok"}'], early_stop)
+            self.assertEqual(result, {"tool": "stop", "result": "ok"})
+
+    def test_unclosed_brace_keeps_nested_actions_together(self):
+        result = parse(['see {x and {"actions": [{"tool": "a"}, {"tool": "b"}]}'])
+        self.assertEqual([c["tool"] for c in action_calls(result)], ["a", "b"])
+
+    def test_no_object(self):
+        self.assertIn("error", parse(["no json {here"]))
+
+
+
+class UsageAfterEarlyStopTest(unittest.TestCase):
+    def parse_metadata(self, tail_delay, **kwargs):
+        async def stream():
+            yield '{"tool": "stop", "result": "ok"}'
+            await asyncio.sleep(tail_delay)
+            yield " trailing prose"
+            yield {"__metadata__": {"tokens_used": 55, "usage_source": "api"}}
+        return asyncio.run(parse_response(stream(), **kwargs))["__metadata__"]
+
+    def test_usage_sent_after_the_action_is_kept(self):
+        self.assertEqual(self.parse_metadata(0), {"tokens_used": 55, "usage_source": "api"})
+
+    def test_slow_tail_is_cancelled_after_the_grace_period(self):
+        metadata = self.parse_metadata(5, usage_grace=0.05)
+        self.assertTrue(metadata["stream_cancelled"])
+
+    def test_api_usage_with_default_settings(self):
+        from benchmarks.stub_llm_server import StubBehavior, start_server
+        from llm.http_pool import close_clients
+        from llm.llm_client import LLMClient
+
+        server, base_url = start_server(StubBehavior(first_token_delay=0, chunks=5))
+
+        async def run():
+            try:
+                client = LLMClient(base_url, "test-key", "stub-model")
+                return await parse_response(client.generate("hi"))
+            finally:
+                await close_clients()
+        try:
+            result = asyncio.run(run())
+        finally:
+            server.shutdown()
+        self.assertEqual(result["tool"], "stop")
+        self.assertEqual(result["__metadata__"]["usage_source"], "api")
+        self.assertNotIn("stream_cancelled", result["__metadata__"])
+
+if __name__ == "__main__":
+    unittest.main()
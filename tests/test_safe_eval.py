@@ -0,0 +1,61 @@
+import unittest
+from tools.calculator import CalculatorTool
+from tools.safe_eval import ExpressionError, compile_expression
+
+
+class SafeEvalTest(unittest.TestCase):
+    def test_arithmetic(self):
+        self.assertEqual(compile_expression("3 + 2 * 4").evaluate(), 11)
+        self.assertAlmostEqual(compile_expression("sqrt(2) * pi").evaluate(), 4.442882938158366)
+
+    def test_rejects_unsafe_syntax(self):
+        for source in ("__import__('os')", "().__class__", "[1, 2]", "lambda: 1", "'a' * 3"):
+            with self.assertRaises(ExpressionError, msg=source):
+                compile_expression(source)
+
+    def test_limits(self):
+        for source in ("9**9**9", "1e300 * 1e10", "(-8) ** 0.5"):
+            with self.assertRaises(ExpressionError, msg=source):
+                compile_expression(source).evaluate()
+
+    def test_arithmetic_errors_become_expression_errors(self):
+        for source in ("0 ** -1", "2**4000 * 1.5", "2**4000 / 3", "1 / 0", "5 % 0"):
+            with self.assertRaises(ExpressionError, msg=source):
+                compile_expression(source).evaluate()
+
+    def test_round_rejects_huge_ndigits(self):
+        # 未限制时 10**ndigits 会让求值卡住数十秒
+        for source in ("round(5, -10**8)", "round(x, -10**8)", "round(1.5, 10**8)"):
+            with self.assertRaises(ExpressionError, msg=source):
+                compile_expression(source).evaluate({"x": 5})
+        self.assertEqual(compile_expression("round(1234.5, -2)").evaluate(), 1200.0)
+        self.assertEqual(compile_expression("round(2.675, 2)").evaluate(), 2.67)
+
+
+class CalculatorToolTest(unittest.TestCase):
+    def setUp(self):
+        self.tool = CalculatorTool()
+
+    def test_errors_are_returned(self):
+        for source in ("0**-1", "2**4000*1.5", "2**4000/3", "import os"):
+            result = self.tool.execute(source)
+            self.assertIn("error", result, source)
+
+    def test_non_numeric_variable(self):
+        result = self.tool.execute({"expression": "x * y", "variables": {"x": "a", "y": 10 ** 9}})
+        self.assertIn("error", result)
+
+    def test_vectorized_rows_fail_independently(self):
+        result = self.tool.execute({"expression": "x**-1", "variables": {"x": [1, 0, 2]}})
+        rows = result["results"]
+        self.assertEqual(rows[0], 1.0)
+        self.assertIn("error", rows[1])
+        self.assertEqual(rows[2], 0.5)
+
+    def test_vectorized_broadcast(self):
+        result = self.tool.execute({"expression": "x*y+1", "variables": {"x": [1, 2, 3], "y": 2}})
+        self.assertEqual(result, {"results": [3, 5, 7]})
+
+
+if __name__ == "__main__":
+    unittest.main()
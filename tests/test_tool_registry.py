@@ -0,0 +1,19 @@
+import sys
+import unittest
+from tools.tool_registry import DEFAULT_TOOLS, ToolRegistry
+
+
+class ToolRegistryTest(unittest.TestCase):
+    def test_default_render_does_not_import_tools(self):
+        sys.modules.pop("tools.calculator", None)
+        registry = ToolRegistry.from_config({"tool_entry_points": False})
+        self.assertIn("<tool name='calculator'>", registry.render())
+        self.assertNotIn("tools.calculator", sys.modules)
+
+    def test_default_description_matches_the_tool(self):
+        from tools.calculator import CalculatorTool
+        self.assertEqual(DEFAULT_TOOLS[0]["description"], CalculatorTool().description)
+
+
+if __name__ == "__main__":
+    unittest.main()
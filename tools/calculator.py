@@ -1,17 +1,31 @@
 from .tool_base import Tool
+from .safe_eval import ExpressionError, compile_expression
+
 
 class CalculatorTool(Tool):
+    cacheable = True
+
     @property
     def name(self):
         return "calculator"
 
     @property
     def description(self):
-        return "Performs mathematical calculations (e.g., '2 + 2')."
+        return ("Performs mathematical calculations (e.g., '2 + 2', 'sqrt(2) * pi'). "
+                "For one expression over many values pass {\"expression\": \"x * y\", "
+                "\"variables\": {\"x\": [1, 2, 3], \"y\": 2}}.")
 
     def execute(self, input_data):
         try:
-            result = eval(input_data)  # Simple eval for demo; use a safer parser in production
-            return {"result": result}
+            if isinstance(input_data, dict):
+                expression = compile_expression(str(input_data.get("expression", "")))
+                variables = input_data.get("variables") or {}
+                if any(isinstance(v, (list, tuple)) for v in variables.values()):
+                    return {"results": expression.evaluate_many(variables)}
+                return {"result": expression.evaluate(variables)}
+            return {"result": compile_expression(str(input_data)).evaluate()}
+        except ExpressionError as e:
+            return {"error": str(e)}
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            # 与旧实现一致：任何异常都作为错误结果返回，而不是抛出工具
+            return {"error": str(e)}
@@ -0,0 +1,215 @@
+import ast
+import math
+import operator
+from functools import lru_cache
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_NODES = 200
+MAX_INT_BITS = 4096         # 整数结果的位数上限（约1233位十进制）
+MAX_FLOAT = 1e300
+MAX_ROUND_DIGITS = 308      # round() 的 ndigits 上限；CPython 会先算 10**ndigits
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+def _round(number, ndigits=None):
+    # round(5, -10**8) 的结果很小，但计算 10**ndigits 会占满CPU很久
+    if ndigits is not None and isinstance(ndigits, int) and abs(ndigits) > MAX_ROUND_DIGITS:
+        raise ExpressionError(f"round 的位数超出范围: {ndigits}")
+    return round(number, ndigits)
+
+
+FUNCTIONS = {
+    "abs": abs, "round": _round, "min": min, "max": max,
+    "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "log10": math.log10, "log2": math.log2,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "asin": math.asin, "acos": math.acos, "atan": math.atan, "atan2": math.atan2,
+    "sinh": math.sinh, "cosh": math.cosh, "tanh": math.tanh,
+    "floor": math.floor, "ceil": math.ceil, "trunc": math.trunc,
+    "degrees": math.degrees, "radians": math.radians, "hypot": math.hypot,
+}
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+class ExpressionError(ValueError):
+    """The expression is not allowed or its evaluation exceeded a limit."""
+
+
+def _check(value):
+    """Enforce the magnitude limits on every intermediate result."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, complex):
+        # 负数的小数次幂等会得到复数，无法序列化进上下文
+        raise ExpressionError("结果不是实数")
+    if isinstance(value, int):
+        if value.bit_length() > MAX_INT_BITS:
+            raise ExpressionError(f"结果过大: 超过 {MAX_INT_BITS} 位")
+    elif isinstance(value, float):
+        if not math.isfinite(value) or abs(value) > MAX_FLOAT:
+            raise ExpressionError("结果过大或不是有限数")
+    return value
+
+
+def _power(base, exponent):
+    # 在真正计算之前估算结果大小，9**9**9 之类的输入直接拒绝
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if (abs(base).bit_length() - 1) * exponent > MAX_INT_BITS:
+            raise ExpressionError(f"指数过大: {base} ** {exponent}")
+    elif isinstance(exponent, (int, float)) and isinstance(base, (int, float)) and abs(base) > 1:
+        if exponent * math.log2(abs(base)) > math.log2(MAX_FLOAT):
+            raise ExpressionError(f"指数过大: {base} ** {exponent}")
+    try:
+        return operator.pow(base, exponent)
+    except ZeroDivisionError:
+        raise ExpressionError("除数为零") from None
+    except (OverflowError, ValueError, TypeError) as e:
+        raise ExpressionError(f"无法计算 {base} ** {exponent}: {e}") from None
+
+
+class _Compiler:
+    """Turn a whitelisted AST into nested closures of (variables) -> value."""
+
+    def __init__(self):
+        self.nodes = 0
+        self.names = set()
+
+    def compile(self, node):
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise ExpressionError(f"表达式过于复杂: 超过 {MAX_NODES} 个节点")
+        method = getattr(self, f"_{type(node).__name__}", None)
+        if method is None:
+            raise ExpressionError(f"不支持的语法: {type(node).__name__}")
+        return method(node)
+
+    def _Expression(self, node):
+        return self.compile(node.body)
+
+    def _Constant(self, node):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ExpressionError(f"不支持的常量: {value!r}")
+        _check(value)
+        return lambda variables: value
+
+    def _Name(self, node):
+        name = node.id
+        if name in CONSTANTS:
+            value = CONSTANTS[name]
+            return lambda variables: value
+        self.names.add(name)
+
+        def load(variables):
+            try:
+                value = variables[name]
+            except KeyError:
+                raise ExpressionError(f"未定义的变量: {name}") from None
+            # 变量只能是数字，避免 "a" * 10**9 之类的非数值运算
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ExpressionError(f"变量必须是数字: {name}={value!r}")
+            return _check(value)
+        return load
+
+    def _BinOp(self, node):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        if isinstance(node.op, ast.Pow):
+            return lambda variables: _check(_power(left(variables), right(variables)))
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+
+        def binary(variables):
+            try:
+                return _check(op(left(variables), right(variables)))
+            except ZeroDivisionError:
+                raise ExpressionError("除数为零") from None
+            except (OverflowError, ValueError, TypeError) as e:
+                # 如 2**4000 * 1.5：大整数转浮点时溢出
+                raise ExpressionError(f"无法计算: {e}") from None
+        return binary
+
+    def _UnaryOp(self, node):
+        op = UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        operand = self.compile(node.operand)
+        return lambda variables: op(operand(variables))
+
+    def _Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = getattr(node.func, "id", type(node.func).__name__)
+            raise ExpressionError(f"不支持的函数: {name}")
+        if node.keywords:
+            raise ExpressionError("不支持关键字参数")
+        func = FUNCTIONS[node.func.id]
+        args = [self.compile(arg) for arg in node.args]
+
+        def call(variables):
+            try:
+                return _check(func(*[arg(variables) for arg in args]))
+            except ExpressionError:
+                raise
+            except (ValueError, OverflowError, TypeError) as e:
+                raise ExpressionError(f"{node.func.id}: {e}") from None
+        return call
+
+
+class CompiledExpression:
+    """A validated expression, ready to evaluate against variable bindings."""
+
+    def __init__(self, source):
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ExpressionError(f"表达式过长: 超过 {MAX_EXPRESSION_LENGTH} 个字符")
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"语法错误: {e.msg}") from None
+        compiler = _Compiler()
+        self.source = source
+        self._func = compiler.compile(tree)
+        self.names = frozenset(compiler.names)
+
+    def evaluate(self, variables=None):
+        return self._func(variables or {})
+
+    def evaluate_many(self, bindings):
+        """Evaluate over arrays of bindings, NumPy-style.
+
+        bindings maps names to sequences of equal length (scalars are
+        broadcast). Returns one result per row; a row that fails yields its
+        error message instead of stopping the batch.
+        """
+        columns = {}
+        length = None
+        for name, value in bindings.items():
+            if isinstance(value, (list, tuple)):
+                if length is not None and len(value) != length:
+                    raise ExpressionError(f"变量长度不一致: {name} 有 {len(value)} 个值，应为 {length}")
+                length = len(value)
+                columns[name] = value
+        if length is None:
+            return [self.evaluate(bindings)]
+        scalars = {name: value for name, value in bindings.items() if name not in columns}
+        results = []
+        row = dict(scalars)
+        for index in range(length):
+            for name, column in columns.items():
+                row[name] = column[index]
+            try:
+                results.append(self.evaluate(row))
+            except ExpressionError as e:
+                results.append({"error": str(e)})
+        return results
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source):
+    """Parse, validate and compile an expression; repeated sources hit the cache."""
+    return CompiledExpression(source)
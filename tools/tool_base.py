@@ -1,6 +1,61 @@
+import asyncio
+import json
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from utils.logger import logger
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+
+# 进程内共享的工具执行配置，由 configure_tool_runtime 设置
+_runtime = {"executor": "thread", "workers": None, "timeout": None, "max_concurrency": None}
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def configure_tool_runtime(executor="thread", workers=None, timeout=None, max_concurrency=None):
+    """Set the process-wide defaults used by Tool.aexecute.
+
+    executor is "thread", "process" or "inline" (run on the event loop);
+    timeout (seconds) and max_concurrency apply to every tool that does not
+    set its own.
+    """
+    if executor not in EXECUTOR_KINDS:
+        raise ValueError(f"无效的工具执行器: {executor}. 必须是 {EXECUTOR_KINDS} 之一")
+    _runtime.update(executor=executor, workers=workers, timeout=timeout, max_concurrency=max_concurrency)
+    logger.debug(f"工具执行配置: 执行器={executor}, 工作线程/进程={workers or '默认'}, "
+                 f"超时={timeout}, 并发上限={max_concurrency}")
+
+
+def _get_executor(kind):
+    with _executors_lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            if kind == "process":
+                executor = ProcessPoolExecutor(max_workers=_runtime["workers"])
+            else:
+                executor = ThreadPoolExecutor(max_workers=_runtime["workers"], thread_name_prefix="tool")
+            _executors[kind] = executor
+        return executor
+
+
+def shutdown_tool_executors():
+    """Shut down the shared tool pools; call once at exit."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 
 class Tool(ABC):
+    # 子类可覆盖；None 表示使用 configure_tool_runtime 的默认值
+    executor = None         # "thread" / "process" / "inline"
+    timeout = None          # 秒
+    max_concurrency = None  # 同一工具实例同时执行的上限
+    cacheable = False       # 相同输入总是得到相同结果且无副作用时设为 True
+    cache_ttl = None        # 秒，缓存结果的有效期；None 表示直到被淘汰
+
     @property
     @abstractmethod
     def name(self):
@@ -13,4 +68,63 @@ class Tool(ABC):
 
     @abstractmethod
     def execute(self, input_data):
-        pass
\ No newline at end of file
+        pass
+
+    def cache_key(self, input_data):
+        """Normalize an input for the result cache; equal keys must mean equal results."""
+        if isinstance(input_data, str):
+            return input_data.strip()
+        return json.dumps(input_data, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def should_cache(self, result):
+        """Whether a normally returned result may be stored; error dicts are not, by default."""
+        return not (isinstance(result, dict) and "error" in result)
+
+    async def aexecute(self, input_data):
+        """Run the tool without blocking the event loop.
+
+        A sync execute() runs on the shared thread or process pool and an
+        async def execute() is awaited on the loop, both under the tool's
+        timeout and concurrency cap. A timed-out sync call is abandoned, not
+        interrupted: its worker keeps running until execute() returns.
+        """
+        timeout = self.timeout if self.timeout is not None else _runtime["timeout"]
+        semaphore = self._get_semaphore()
+        if semaphore is None:
+            return await self._run_with_timeout(input_data, timeout)
+        async with semaphore:
+            return await self._run_with_timeout(input_data, timeout)
+
+    def _get_semaphore(self):
+        limit = self.max_concurrency if self.max_concurrency is not None else _runtime["max_concurrency"]
+        if not limit:
+            return None
+        semaphore = self.__dict__.get("_semaphore")
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+            self.__dict__["_semaphore"] = semaphore
+        return semaphore
+
+    async def _run_with_timeout(self, input_data, timeout):
+        if timeout is None:
+            return await self._run(input_data)
+        try:
+            return await asyncio.wait_for(self._run(input_data), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"工具执行超时: {self.name}, 超时={timeout}秒") from None
+
+    async def _run(self, input_data):
+        if asyncio.iscoroutinefunction(self.execute):
+            # 原生异步工具直接在事件循环中等待，放进线程池只会得到未执行的协程对象
+            return await self.execute(input_data)
+        kind = self.executor or _runtime["executor"]
+        if kind == "inline":
+            return self.execute(input_data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(kind), self.execute, input_data)
+
+    def __getstate__(self):
+        # 进程池需要序列化工具实例；信号量只属于当前进程
+        state = self.__dict__.copy()
+        state.pop("_semaphore", None)
+        return state
@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+from utils.logger import logger
+
+MISSING = object()
+
+
+class ToolResultCache:
+    """Process-wide LRU of tool results for tools that declare themselves cacheable.
+
+    Keys are (tool name, normalized input) from Tool.cache_key(); each entry
+    expires after the TTL of the tool that produced it (None keeps it until
+    evicted). Only results of calls that returned normally are stored.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (result, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        logger.debug(f"初始化工具结果缓存: 容量={max_entries}")
+
+    def get(self, key):
+        """Return the cached result, or MISSING."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                result, expires_at = value
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def put(self, key, result, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (result, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,187 @@
+import importlib
+import threading
+from importlib import metadata
+from .tool_base import Tool
+from prompt.prompt_generator import render_tool
+from utils.logger import logger
+
+ENTRY_POINT_GROUP = "mixlab_agent.tools"
+# 描述与 CalculatorTool.description 保持一致，渲染提示时就不必导入计算器模块
+DEFAULT_TOOLS = [{
+    "name": "calculator",
+    "path": "tools.calculator:CalculatorTool",
+    "description": ("Performs mathematical calculations (e.g., '2 + 2', 'sqrt(2) * pi'). "
+                    "For one expression over many values pass {\"expression\": \"x * y\", "
+                    "\"variables\": {\"x\": [1, 2, 3], \"y\": 2}}.")
+}]
+
+
+def _resolve(path):
+    """Import "package.module:attr" and return attr."""
+    module_name, _, attr = path.partition(":")
+    if not attr:
+        raise ValueError(f"无效的工具路径: {path}，应为 'module:attr'")
+    target = importlib.import_module(module_name)
+    for part in attr.split("."):
+        target = getattr(target, part)
+    return target
+
+
+def _instantiate(target):
+    """A Tool instance is used as is; a Tool class or factory is called without arguments."""
+    if isinstance(target, Tool):
+        return target
+    if callable(target):
+        target = target()
+    if not isinstance(target, Tool):
+        raise TypeError(f"不是Tool实例: {target!r}")
+    return target
+
+
+class ToolRegistry:
+    """Tools by name, imported and instantiated on first use.
+
+    A tool is registered as an instance, or lazily as a "module:attr" path or
+    an entry point. Lookups are a dict access; the module is imported the
+    first time get() needs it. A description given at registration lets the
+    prompt be rendered without importing the tool at all. Each rendered
+    <tool> line is cached, as is the whole block until the registry changes.
+    """
+
+    def __init__(self, tools=None):
+        self._loaders = {}        # name -> 无参函数，返回工具实例
+        self._tools = {}          # name -> 已加载的工具实例
+        self._descriptions = {}   # name -> 注册时提供的描述
+        self._rendered = {}       # name -> 渲染好的 <tool> 行
+        self._block = None
+        self._lock = threading.RLock()
+        for tool in tools or []:
+            self.add(tool)
+
+    def add(self, tool):
+        """Register an already constructed tool."""
+        with self._lock:
+            self._set(tool.name, lambda: tool)
+            self._tools[tool.name] = tool
+
+    def register(self, name, path, description=None):
+        """Register a tool by "module:attr" path; nothing is imported yet."""
+        with self._lock:
+            self._set(name, lambda: _instantiate(_resolve(path)), description)
+        logger.debug(f"注册工具: {name} -> {path}")
+
+    def register_entry_point(self, entry_point, description=None):
+        with self._lock:
+            self._set(entry_point.name, lambda: _instantiate(entry_point.load()), description)
+        logger.debug(f"注册工具入口点: {entry_point.name} -> {entry_point.value}")
+
+    def discover(self, group=ENTRY_POINT_GROUP):
+        """Register every tool advertised under an entry point group; returns the names found.
+
+        Only package metadata is read here; tools explicitly registered keep precedence.
+        """
+        try:
+            found = metadata.entry_points(group=group)
+        except TypeError:
+            # Python < 3.10 返回按组划分的字典
+            found = metadata.entry_points().get(group, [])
+        names = []
+        for entry_point in found:
+            if entry_point.name in self._loaders:
+                continue
+            self.register_entry_point(entry_point)
+            names.append(entry_point.name)
+        return names
+
+    def _set(self, name, loader, description=None):
+        self._loaders[name] = loader
+        self._tools.pop(name, None)
+        self._rendered.pop(name, None)
+        if description is not None:
+            self._descriptions[name] = description
+        else:
+            self._descriptions.pop(name, None)
+        self._block = None
+
+    def unregister(self, name):
+        with self._lock:
+            self._loaders.pop(name, None)
+            self._tools.pop(name, None)
+            self._descriptions.pop(name, None)
+            self._rendered.pop(name, None)
+            self._block = None
+
+    def get(self, name):
+        """Return the tool registered as `name`, loading it if needed; None if unknown.
+
+        Import or construction errors propagate to the caller.
+        """
+        tool = self._tools.get(name)
+        if tool is not None:
+            return tool
+        loader = self._loaders.get(name)
+        if loader is None:
+            return None
+        with self._lock:
+            tool = self._tools.get(name)
+            if tool is None:
+                tool = loader()
+                if tool.name != name:
+                    logger.warning(f"工具注册名与工具名不一致: {name} != {tool.name}，按注册名调用")
+                self._tools[name] = tool
+                logger.debug(f"加载工具: {name} ({type(tool).__name__})")
+        return tool
+
+    def names(self):
+        return list(self._loaders)
+
+    def loaded(self):
+        return list(self._tools)
+
+    def __contains__(self, name):
+        return name in self._loaders
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def __iter__(self):
+        """Yield every tool, loading any that are not loaded yet."""
+        for name in self.names():
+            yield self.get(name)
+
+    def render(self):
+        """The <tool> lines for the prompt; cached until a tool is added or removed."""
+        block = self._block
+        if block is None:
+            with self._lock:
+                parts = []
+                for name in self._loaders:
+                    part = self._rendered.get(name)
+                    if part is None:
+                        description = self._descriptions.get(name)
+                        if description is None:
+                            description = self.get(name).description
+                        part = render_tool(name, description)
+                        self._rendered[name] = part
+                    parts.append(part)
+                block = self._block = "\n".join(parts)
+        return block
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the registry from config["tools"] plus entry points when config["tool_entry_points"] is set.
+
+        Each tools item is "name=module:attr" or {"name", "path", "description"}.
+        """
+        registry = cls()
+        for item in config.get("tools") or DEFAULT_TOOLS:
+            if isinstance(item, str):
+                name, sep, path = item.partition("=")
+                if not sep:
+                    raise ValueError(f"无效的工具配置: {item}，应为 'name=module:attr'")
+                registry.register(name.strip(), path.strip())
+            else:
+                registry.register(item["name"], item["path"], item.get("description"))
+        if config.get("tool_entry_points", True):
+            registry.discover()
+        return registry
@@ -1,15 +1,23 @@
 import os
+import atexit
 import logging
+import queue
 import sys
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 import colorama
 
 # 初始化colorama以支持Windows终端中的颜色
 colorama.init()
 
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# 这些类型的参数不可变，可以原样放进队列，由后台线程再格式化
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, type(None))
+
+
 class ColoredFormatter(logging.Formatter):
     """为不同级别的日志添加不同颜色"""
-    
+
     # 颜色代码
     COLORS = {
         'DEBUG': colorama.Fore.CYAN,
@@ -18,7 +26,7 @@ class ColoredFormatter(logging.Formatter):
         'ERROR': colorama.Fore.RED,
         'CRITICAL': colorama.Fore.RED + colorama.Style.BRIGHT
     }
-    
+
     # INFO级别的细分颜色
     INFO_COLORS = {
         'DEFAULT': colorama.Fore.GREEN,
@@ -29,69 +37,88 @@ class ColoredFormatter(logging.Formatter):
         'API': colorama.Fore.LIGHTBLUE_EX,
         'USER': colorama.Fore.LIGHTYELLOW_EX
     }
-    
+
+    # 不同INFO类型的前缀
+    INFO_PREFIXES = {
+        'RESULT': '▶ 结果: ',
+        'SUCCESS': '✓ ',
+        'STATUS': '⚡ ',
+        'DATA': '📊 ',
+        'API': '🔌 ',
+        'USER': '👤 '
+    }
+
+    def __init__(self, fmt=LOG_FORMAT, datefmt=None):
+        super().__init__(fmt, datefmt)
+        # 每种级别/INFO类型预先构建一个格式化器；format() 只做查表，
+        # 不再临时改写 self._style._fmt，多线程下也安全
+        reset = colorama.Style.RESET_ALL
+        self._level_formatters = {
+            level: logging.Formatter(f"{color}{fmt}{reset}", datefmt)
+            for level, color in self.COLORS.items() if level != 'INFO'
+        }
+        self._info_formatters = {
+            info_type: logging.Formatter(f"{color}{self.INFO_PREFIXES.get(info_type, '')}%(message)s{reset}", datefmt)
+            for info_type, color in self.INFO_COLORS.items()
+        }
+
     def format(self, record):
-        # 保存原始格式
-        format_orig = self._style._fmt
-        
-        # 根据日志级别添加颜色
-        if record.levelname in self.COLORS:
-            if record.levelname == 'INFO':
-                # 检查是否有特定的INFO类型
-                info_type = getattr(record, 'info_type', 'DEFAULT')
-                color = self.INFO_COLORS.get(info_type, self.INFO_COLORS['DEFAULT'])
-                
-                # 根据不同的INFO类型使用不同的格式
-                if info_type == 'RESULT':
-                    prefix = '▶ 结果: '
-                elif info_type == 'SUCCESS':
-                    prefix = '✓ '
-                elif info_type == 'STATUS':
-                    prefix = '⚡ '
-                elif info_type == 'DATA':
-                    prefix = '📊 '
-                elif info_type == 'API':
-                    prefix = '🔌 '
-                elif info_type == 'USER':
-                    prefix = '👤 '
-                else:
-                    prefix = ''
-                
-                self._style._fmt = f"{color}{prefix}%(message)s{colorama.Style.RESET_ALL}"
-            else:
-                self._style._fmt = f"{self.COLORS[record.levelname]}%(asctime)s - %(name)s - %(levelname)s - %(message)s{colorama.Style.RESET_ALL}"
-                
-        # 调用原始format方法
-        result = logging.Formatter.format(self, record)
-        
-        # 恢复原始格式
-        self._style._fmt = format_orig
-        
-        return result
+        if record.levelname == 'INFO':
+            # 检查是否有特定的INFO类型
+            info_type = getattr(record, 'info_type', 'DEFAULT')
+            formatter = self._info_formatters.get(info_type, self._info_formatters['DEFAULT'])
+        else:
+            formatter = self._level_formatters.get(record.levelname)
+            if formatter is None:
+                return logging.Formatter.format(self, record)
+        return formatter.format(record)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread when it is safe.
+
+    The stock prepare() formats the full line on the calling thread. Here the
+    arguments are only merged early when one of them is mutable, since it
+    could change before the listener gets to it.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        # 单个字典参数会被 logging 直接存为 args 本身
+        if args and (isinstance(args, dict) or not all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # traceback 对象不能跨线程长期持有，先渲染成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 class Logger:
     def __init__(self, name="mixlab-agent"):
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.INFO)
-        
+
         # 判断是否为开发环境
         self.is_dev = os.getenv("MIXLAB_ENV", "production").lower() == "development"
-        
+        self.logger.setLevel(logging.DEBUG if self.is_dev else logging.INFO)
+        self._listener = None
+
         # 清除现有的handlers（防止重复）
         if self.logger.handlers:
             self.logger.handlers.clear()
-        
+
         # 创建控制台处理程序
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.DEBUG if self.is_dev else logging.INFO)
-        
+
         # 设置彩色格式
-        formatter = ColoredFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        formatter = ColoredFormatter(LOG_FORMAT)
         console_handler.setFormatter(formatter)
-        
+
         # 添加处理程序
         self.logger.addHandler(console_handler)
-        
+
         # 可选：添加文件处理程序（仅在开发环境）
         if self.is_dev:
             log_dir = os.path.join(os.getcwd(), "logs")
@@ -101,55 +128,80 @@ class Logger:
             )
             file_handler.setLevel(logging.DEBUG)
             # 文件中使用普通格式（无颜色）
-            file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            file_formatter = logging.Formatter(LOG_FORMAT)
             file_handler.setFormatter(file_formatter)
             self.logger.addHandler(file_handler)
-    
-    def debug(self, message):
-        """仅在开发环境中记录调试信息"""
+
+    def start_queue(self):
+        """Move console/file output to a background thread so callers never block on I/O.
+
+        Records go through an unbounded queue to a QueueListener that owns
+        the real handlers. Call stop_queue() at exit to drain it (it is also
+        registered with atexit).
+        """
+        if self._listener is not None:
+            return
+        handlers = list(self.logger.handlers)
+        log_queue = queue.SimpleQueue()
+        self._listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.logger.handlers = [_LazyQueueHandler(log_queue)]
+        self._listener.start()
+        atexit.register(self.stop_queue)
+
+    def stop_queue(self):
+        """Flush queued records and write synchronously again."""
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        listener.stop()
+        self.logger.handlers = list(listener.handlers)
+        atexit.unregister(self.stop_queue)
+
+    def debug(self, message, *args):
+        """仅在开发环境中记录调试信息；带 args 时按 % 格式延迟格式化"""
         if self.is_dev:
-            self.logger.debug(message)
-    
-    def info(self, message, info_type='DEFAULT'):
+            self.logger.debug(message, *args)
+
+    def info(self, message, *args, info_type='DEFAULT'):
         """记录一般信息，可以指定INFO的子类型"""
         extra = {'info_type': info_type}
-        self.logger.info(message, extra=extra)
-    
-    def success(self, message):
+        self.logger.info(message, *args, extra=extra)
+
+    def success(self, message, *args):
         """记录成功信息（使用INFO级别，但有特殊颜色和格式）"""
-        self.info(message, info_type='SUCCESS')
-    
-    def status(self, message):
+        self.info(message, *args, info_type='SUCCESS')
+
+    def status(self, message, *args):
         """记录状态更新信息（使用INFO级别，但有特殊颜色和格式）"""
-        self.info(message, info_type='STATUS')
-    
-    def data(self, message):
+        self.info(message, *args, info_type='STATUS')
+
+    def data(self, message, *args):
         """记录数据相关信息（使用INFO级别，但有特殊颜色和格式）"""
-        self.info(message, info_type='DATA')
-    
-    def api(self, message):
+        self.info(message, *args, info_type='DATA')
+
+    def api(self, message, *args):
         """记录API相关信息（使用INFO级别，但有特殊颜色和格式）"""
-        self.info(message, info_type='API')
-    
-    def user(self, message):
+        self.info(message, *args, info_type='API')
+
+    def user(self, message, *args):
         """记录用户相关信息（使用INFO级别，但有特殊颜色和格式）"""
-        self.info(message, info_type='USER')
-    
-    def warning(self, message):
+        self.info(message, *args, info_type='USER')
+
+    def warning(self, message, *args):
         """记录警告信息"""
-        self.logger.warning(message)
-    
-    def error(self, message):
+        self.logger.warning(message, *args)
+
+    def error(self, message, *args):
         """记录错误信息"""
-        self.logger.error(message)
-    
-    def critical(self, message):
+        self.logger.error(message, *args)
+
+    def critical(self, message, *args):
         """记录严重错误信息"""
-        self.logger.critical(message)
-    
-    def result(self, message):
+        self.logger.critical(message, *args)
+
+    def result(self, message, *args):
         """记录重要结果（使用INFO级别，但有特殊格式）"""
-        self.info(message, info_type='RESULT')
+        self.info(message, *args, info_type='RESULT')
 
 # 创建默认日志记录器实例
-logger = Logger() 
\ No newline at end of file
+logger = Logger()
@@ -0,0 +1,256 @@
+import bisect
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.logger import logger
+
+# 秒；覆盖从毫秒级的数据库写入到分钟级的LLM长输出
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+STEP_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.labelnames, k)), "value": v} for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down per label set."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    render = Counter.render
+    snapshot = Counter.snapshot
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; quantiles are interpolated within the bucket that holds them.
+
+    Interpolated quantiles are clamped to the smallest and largest observed
+    values, so a series of identical observations reports that value.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [每个桶的计数(最后一个为+Inf), 总和, 总数, 最小值, 最大值]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, value, value]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+            if value < state[3]:
+                state[3] = value
+            elif value > state[4]:
+                state[4] = value
+
+    def _quantile(self, counts, total, q, minimum, maximum):
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                # +Inf 桶没有上界，用观测到的最大值代替
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, minimum), maximum)
+            seen += count
+        return 0.0
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._values.items()]
+        lines = []
+        for key, counts, total_sum, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2], s[3], s[4]) for k, s in self._values.items()]
+        result = []
+        for key, counts, total_sum, count, minimum, maximum in items:
+            entry = {"labels": dict(zip(self.labelnames, key)), "count": count, "sum": total_sum,
+                     "mean": total_sum / count if count else 0.0, "min": minimum, "max": maximum}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = self._quantile(counts, count, q, minimum, maximum)
+            result.append(entry)
+        return result
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms, rendered as Prometheus text or a JSON-friendly snapshot."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """{name: [per-label-set values]}; histograms include count, sum, mean and p50/p95/p99."""
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+
+REGISTRY = MetricsRegistry()
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "mixlab_llm_request_seconds", "LLM streamed completion time, from admission to last chunk",
+    ("model", "outcome"))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "mixlab_llm_first_token_seconds", "Time to the first streamed chunk, including retries and hedging", ("model",))
+LLM_TOKENS = REGISTRY.counter("mixlab_llm_tokens_total", "Tokens used by LLM calls", ("model", "kind"))
+TOOL_SECONDS = REGISTRY.histogram("mixlab_tool_seconds", "Tool call time", ("tool", "status"))
+DB_WRITE_SECONDS = REGISTRY.histogram("mixlab_db_write_seconds", "Context database write time", ("op",))
+SESSION_STEPS = REGISTRY.histogram("mixlab_session_steps", "Agent steps per session", buckets=STEP_BUCKETS)
+ACTIVE_SESSIONS = REGISTRY.gauge("mixlab_active_sessions", "Agent sessions currently running")
+ERRORS = REGISTRY.counter("mixlab_errors_total", "Errors by component", ("component",))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve GET /metrics in Prometheus text format from a daemon thread; returns the server."""
+    handler = type("BoundMetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.debug(f"指标端点已启动: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def dump_snapshot(path=None, registry=REGISTRY):
+    """Log the p50/p95/p99 of every histogram and, with path set, write the full snapshot as JSON."""
+    snapshot = registry.snapshot()
+    for name, values in snapshot.items():
+        for value in values:
+            labels = ",".join(f"{k}={v}" for k, v in value["labels"].items())
+            label_text = f"{{{labels}}}" if labels else ""
+            if "p50" in value:
+                logger.data(f"{name}{label_text}: 次数={value['count']}, p50={value['p50']:.3f}, "
+                            f"p95={value['p95']:.3f}, p99={value['p99']:.3f}")
+            else:
+                logger.data(f"{name}{label_text}: {value['value']}")
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        logger.debug(f"指标快照已写入: {path}")
+    return snapshot
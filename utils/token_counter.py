@@ -0,0 +1,18 @@
+def _is_wide(char):
+    # CJK 统一表意文字、假名、谚文及全角符号：大多数分词器中约一个字符一个token
+    code = ord(char)
+    return (
+        0x2E80 <= code <= 0x9FFF
+        or 0xAC00 <= code <= 0xD7AF
+        or 0xF900 <= code <= 0xFAFF
+        or 0xFF00 <= code <= 0xFFEF
+    )
+
+
+def estimate_tokens(text):
+    """Cheap token estimate: one token per CJK character, ~4 characters per token otherwise."""
+    if not text:
+        return 0
+    wide = sum(1 for char in text if _is_wide(char))
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
@@ -0,0 +1,260 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import logger
+
+EXPORTERS = ("jsonl", "otlp")
+FLUSH_SIZE = 256
+
+# 当前活动的span；asyncio 任务各自持有一份上下文，并发会话互不干扰
+_current = contextvars.ContextVar("mixlab_trace_span", default=None)
+_tracer = None
+
+
+def _new_id(n_bytes):
+    return os.urandom(n_bytes).hex()
+
+
+class JsonlExporter:
+    """Append finished spans as JSON lines; buffered and written in batches."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def close(self):
+        pass
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter:
+    """POST spans to an OpenTelemetry collector as OTLP/HTTP JSON, on a background thread."""
+
+    def __init__(self, endpoint, service_name="mixlab-agent", timeout=5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+
+    def _payload(self, spans):
+        otlp_spans = []
+        for s in spans:
+            attributes = dict(s["attributes"], **{k: s[k] for k in ("session_id", "step") if s[k] is not None})
+            otlp_spans.append({
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                "parentSpanId": s["parent_id"] or "",
+                "name": s["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(s["start_ns"]),
+                "endTimeUnixNano": str(s["start_ns"] + int(s["duration_ms"] * 1e6)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+                "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1}
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "mixlab-agent"}, "spans": otlp_spans}]
+        }]}
+
+    def _post(self, spans):
+        body = json.dumps(self._payload(spans)).encode("utf-8")
+        request = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except Exception as e:
+            logger.warning(f"导出追踪数据失败: {self.endpoint}, 错误={str(e)}")
+
+    def export(self, spans):
+        self._executor.submit(self._post, spans)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class _Span:
+    """An open span; use as a context manager around synchronous or awaited code."""
+
+    __slots__ = ("tracer", "name", "attributes", "trace_id", "span_id", "parent_id",
+                 "session_id", "step", "start", "start_ns", "token")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        parent = _current.get()
+        attributes = self.attributes
+        if parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.session_id = attributes.pop("session_id", parent.session_id)
+            self.step = attributes.pop("step", parent.step)
+        else:
+            self.trace_id = _new_id(16)
+            self.parent_id = None
+            self.session_id = attributes.pop("session_id", None)
+            self.step = attributes.pop("step", None)
+        self.span_id = _new_id(8)
+        self.token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _current.reset(self.token)
+        self.tracer._finish(self, end - self.start, f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Collects spans (name, ids, session/step, monotonic duration, attributes) and hands them to an exporter.
+
+    Spans nest through a context variable, so a span opened inside another
+    one, in the same task or in one it spawned, becomes its child and
+    inherits its session_id and step. Durations come from perf_counter;
+    the wall-clock start is kept only to place spans on a timeline.
+    Finished spans are buffered and exported when a root span ends or the
+    buffer fills.
+    """
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def span(self, name, **attributes):
+        return _Span(self, name, attributes)
+
+    def record(self, name, start, end=None, error=None, **attributes):
+        """Record a span measured outside a with block (e.g. across an async generator's yields).
+
+        start and end are perf_counter() values; the parent is the span
+        current at the time of the call.
+        """
+        if end is None:
+            end = time.perf_counter()
+        span = _Span(self, name, attributes)
+        span.__enter__()
+        _current.reset(span.token)
+        span.start_ns -= int((span.start - start) * 1e9)
+        self._finish(span, end - start, error)
+
+    def _finish(self, span, duration, error):
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "session_id": span.session_id,
+            "step": span.step,
+            "start_ns": span.start_ns,
+            "duration_ms": round(duration * 1000, 3),
+            "error": error,
+            "attributes": span.attributes
+        }
+        with self._lock:
+            self._buffer.append(record)
+            if span.parent_id is not None and len(self._buffer) < FLUSH_SIZE:
+                return
+            spans, self._buffer = self._buffer, []
+        self._export(spans)
+
+    def _export(self, spans):
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logger.warning(f"导出追踪数据失败: {str(e)}")
+
+    def flush(self):
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if spans:
+            self._export(spans)
+
+    def close(self):
+        self.flush()
+        self.exporter.close()
+
+
+def configure_tracing(export=None, path="data/traces.jsonl", endpoint="http://localhost:4318/v1/traces",
+                      service_name="mixlab-agent"):
+    """Enable process-wide tracing: export is "jsonl", "otlp", or None to disable."""
+    global _tracer
+    shutdown_tracing()
+    if not export:
+        return None
+    if export == "jsonl":
+        exporter = JsonlExporter(path)
+    elif export == "otlp":
+        exporter = OTLPExporter(endpoint, service_name=service_name)
+    else:
+        raise ValueError(f"无效的追踪导出方式: {export}. 必须是 {EXPORTERS} 之一")
+    _tracer = Tracer(exporter)
+    logger.debug(f"追踪已开启: 导出={export}, 目标={path if export == 'jsonl' else endpoint}")
+    return _tracer
+
+
+def shutdown_tracing():
+    """Export buffered spans and stop the exporter; call once at exit."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+def span(name, **attributes):
+    """Open a span under the current one; a no-op when tracing is off."""
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP_SPAN
+    return tracer.span(name, **attributes)
+
+
+def record_span(name, start, end=None, error=None, **attributes):
+    """Tracer.record on the process-wide tracer; a no-op when tracing is off."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.record(name, start, end, error, **attributes)